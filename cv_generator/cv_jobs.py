@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from dbprocess.db_manager import dbManager, dbUnavailableError
+
+logger = logging.getLogger(__name__)
+
+CV_JOBS_COLLECTION = "cv_jobs"
+
+class cvJobQueueFull(Exception):
+  pass
+
+class cvJobQueue:
+  """CV üretimlerini sınırlı bir worker havuzunda çalıştırır; durum ve sonuç Mongo'da tutulur."""
+  def __init__(self, db: dbManager, generate: Callable[..., Awaitable[str]], workers: int = 4, max_pending: int = 100):
+    self.db = db
+    self.generate = generate
+    self.workers = max(1, workers)
+    self.queue: asyncio.Queue = asyncio.Queue(maxsize = max_pending)
+    self.tasks: List[asyncio.Task] = []
+
+  async def Start(self):
+    self.tasks = [asyncio.create_task(self._Worker(i)) for i in range(self.workers)]
+    logger.info(f"CV iş kuyruğu {self.workers} worker ile başlatıldı.")
+
+  async def Stop(self):
+    for task in self.tasks:
+      task.cancel()
+    await asyncio.gather(*self.tasks, return_exceptions = True)
+    self.tasks = []
+    while not self.queue.empty():
+      cv_job_id = self.queue.get_nowait()[0]
+      await self._SetFailed(cv_job_id, "Sunucu kapatıldı")
+
+  async def Submit(self, raw_cv: str, job_id: int, target_lang: str) -> str:
+    if self.queue.full():
+      raise cvJobQueueFull("CV iş kuyruğu dolu")
+    cv_job_id = uuid.uuid4().hex
+    await self.db.UpdateOne(
+      CV_JOBS_COLLECTION,
+      {"_id": cv_job_id},
+      {"$set": {
+        "status": "queued",
+        "job_id": job_id,
+        "target_lang": target_lang,
+        "created_at": datetime.now()
+      }},
+      upsert = True
+    )
+    try:
+      self.queue.put_nowait((cv_job_id, raw_cv, job_id, target_lang))
+    except asyncio.QueueFull:
+      # Kayıt yazılırken eşzamanlı istekler kuyruğu doldurmuş olabilir; iş "queued"da asılı kalmasın
+      await self._SetFailed(cv_job_id, "CV iş kuyruğu dolu")
+      raise cvJobQueueFull("CV iş kuyruğu dolu")
+    return cv_job_id
+
+  async def Get(self, cv_job_id: str) -> Optional[Dict]:
+    return await self.db.FindOne(CV_JOBS_COLLECTION, {"_id": cv_job_id})
+
+  async def _SetStatus(self, cv_job_id: str, fields: Dict):
+    await self.db.UpdateOne(CV_JOBS_COLLECTION, {"_id": cv_job_id}, {"$set": fields})
+
+  async def _SetFailed(self, cv_job_id: str, error: str):
+    # Hata yolundaki yazma da düşebilir (ör. dbUnavailableError); worker döngüsü bundan etkilenmemeli
+    try:
+      await self._SetStatus(cv_job_id, {"status": "failed", "error": error, "finished_at": datetime.now()})
+    except Exception:
+      logger.exception(f"CV işi {cv_job_id} başarısız olarak işaretlenemedi")
+
+  async def _Worker(self, idx: int):
+    while True:
+      cv_job_id, raw_cv, job_id, target_lang = await self.queue.get()
+      try:
+        await self._SetStatus(cv_job_id, {"status": "running", "started_at": datetime.now()})
+        latex_cv = await self.generate(raw_cv, job_id, target_lang)
+        await self._SetStatus(cv_job_id, {"status": "done", "latex_cv": latex_cv, "finished_at": datetime.now()})
+      except asyncio.CancelledError:
+        await self._SetFailed(cv_job_id, "Sunucu kapatıldı")
+        raise
+      except ValueError as ve:
+        await self._SetFailed(cv_job_id, str(ve))
+      except dbUnavailableError:
+        logger.exception(f"CV işi {cv_job_id} veritabanına ulaşılamadığı için başarısız oldu")
+        await self._SetFailed(cv_job_id, "Veritabanına ulaşılamadı, lütfen tekrar deneyin")
+      except Exception:
+        logger.exception(f"CV işi {cv_job_id} başarısız oldu")
+        await self._SetFailed(cv_job_id, "Sunucu hatası")
+      finally:
+        self.queue.task_done()
+
+def BuildCvJobQueue(db: dbManager, generate: Callable[..., Awaitable[str]]) -> cvJobQueue:
+  return cvJobQueue(
+    db,
+    generate,
+    workers = int(os.getenv("CV_JOB_WORKERS", "4")),
+    max_pending = int(os.getenv("CV_JOB_MAX_PENDING", "100"))
+  )
@@ -1,87 +1,132 @@
 import asyncio
+import hashlib
 import os
-from dbprocess.db_manager import dbManager
+from typing import Optional
+from dbprocess.db_manager import dbManager, db as sharedDb
+from nlp.analysis_model import CV_PROMPT_PROJECTION, LoadAnalysis, jobAnalysis
+from nlp.extraction_cache import lruCacheBackend, mongoCacheBackend
 from nlp.mistral_websocket import mistralWebSocketClient
-from nlp.nlpApi import ExtractJobData, GenerateLatexCv
+from nlp.performance_monitor import performance_monitor
+from nlp.nlpApi import ExtractJobData, GenerateLatexCv, StreamLatexCv, CloseMistralClient
 import logging
 import json
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-MONGODB_DB = os.getenv("MONGODB_DB", "jobscrapper")
+ATS_PROMPT_VERSION = "1"
+ATS_SYSTEM_PROMPT = (
+  "Sen kıdemli bir “ATS Resume Optimizer” yapay zekâsısın.\n"
+  "Girdi JSON’unda üç alan bulunur:\n"
+  "* \"analysis_result\"  → İLAN ANALİZİ\n"
+  "* \"raw_cv\"           → ADAYIN CV’Sİ\n"
+  "* \"target_lang\"      → TR veya EN\n\n"
+  "**AMAÇ**\n"
+  "• CV’yi, ilanın gerektirdiği beceri ve sorumlulukları açıkça vurgulayacak şekilde yeniden düzenle.\n"
+  "• Çıktı yalnızca geçerli, **ATS uyumlu, derlenebilir düz LaTeX CV kodu** olmalı. **Başka hiçbir metin, JSON, markdown çiti veya yorum üretme.**\n"
+  "• **Kesinlikle yalan bilgi ekleme.** Sadece adayın CV’sinde zaten bulunan becerileri veya bunların **doğrudan eş, üst veya alt kavramlarını** kullanabilirsin.\n"
+  "• ATS botlarının okumasını zorlaştıracak hiçbir tasarım unsuru (renk, tablo, çizgi, ikon, grafik vb.) kullanma.\n"
+  "• Çıktıda yalnızca sade LaTeX paketlerini (ör. `article`, `geometry`, `enumitem`) kullan. `xcolor`, `fancyhdr`, `tabularx`, `tikz` gibi görsellik paketleri yasaktır.\n"
+  "**YAPISAL KURALLAR**\n"
+  "• Başlıklar şu sırayla ve İngilizce/Türkçe çevirisine uygun olmalı: \n"
+  "  1. İletişim Bilgileri (Contact Information)\n"
+  "  2. Özet (Summary)\n"
+  "  3. Yetenekler (Skills)\n"
+  "  4. Çalışma Deneyimi (Work Experience)\n"
+  "  5. Eğitim (Education)\n"
+  "• Eğer \"target_lang\":\"TR\" ise LaTeX içeriğinin tamamı Türkçe olacak; özel isimler (ör. şirket adları) hariç İngilizce kullanma.\n"
+  "• Eğer \"target_lang\":\"EN\" ise LaTeX içeriği yalnızca İngilizce olacak; özel isimler hariç Türkçe kullanma.\n"
+  "**ADIMLAR**\n"
+  "1 **İlanı Ayrıştır**\n"
+  "   - `requirements` ve `analysis_result` içindeki tüm anahtar terimleri topla ve normalize et.\n"
+  "2 **CV’yi Ayrıştır**\n"
+  "   - Standart bölümleri (Özet, Deneyim, Eğitim, Yetenekler vb.) tespit et ve normalize et.\n"
+  "3 **Eşleme & Genişletme**\n"
+  "   - CV’deki terimler için eş/üst/alt kavram haritası uygula.\n"
+  "   - İlan terimlerinden sadece CV’de karşılığı olanları veya kavramsal eşleşenleri ekle.\n"
+  "4 **LaTeX Üretimi**\n"
+  "   - Maksimum iki sayfa olacak şekilde gereksiz detayları çıkar.\n"
+  "   - Sadece dolu bölümlerle sade, ATS uyumlu bir LaTeX şablonu üret.\n"
+  "5 **SONUÇ**\n"
+  "   - Yalnızca LaTeX kodunu TEK BLOK olarak döndür; başında veya sonunda hiçbir ekstra karakter, boş satır veya yorum olmasın.\n"
+)
 
-async def GenerateAtsCv(rawCV: str, jbId: int, tgtLang: str, hpth: str = "heb.txt"):
-  db = dbManager(MONGODB_URI, MONGODB_DB)
+def CvPromptVersion() -> str:
+  prompt_hash = hashlib.sha1(ATS_SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:10]
+  return f"{ATS_PROMPT_VERSION}:{prompt_hash}"
 
-  jbDc = await db.FindOne(
-    "job_analysis_results",
-    { "job_id": jbId }
-  )
+def CvCacheKey(rawCV: str, jbId: int, tgtLang: str) -> str:
+  raw = json.dumps([CvPromptVersion(), rawCV, jbId, tgtLang], ensure_ascii = False)
+  return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
-  if( not jbDc or "analysis_result" not in jbDc ):
+cv_cache = [
+  lruCacheBackend(int(os.getenv("CV_CACHE_LRU_SIZE", "256"))),
+  mongoCacheBackend(sharedDb, col = "cv_cache", version_fn = CvPromptVersion)
+]
+
+async def GetCachedCv(key: str) -> Optional[str]:
+  for idx, backend in enumerate(cv_cache):
+    try:
+      latex = await backend.Get(key)
+    except Exception as exc:
+      logger.warning(f"CV önbellek okuma hatası ({backend.name}): {exc}")
+      continue
+    if latex:
+      for upper in cv_cache[:idx]:
+        await upper.Set(key, latex)
+      return latex
+  return None
+
+async def StoreCachedCv(key: str, latex: str):
+  for backend in cv_cache:
+    try:
+      await backend.Set(key, latex)
+    except Exception as exc:
+      logger.warning(f"CV önbellek yazma hatası ({backend.name}): {exc}")
+
+async def BuildAtsPrompt(rawCV: str, jbId: int, tgtLang: str, db: dbManager) -> str:
+  with performance_monitor.Span("mongo_lookup"):
+    # Yalnızca prompt'ta kullanılan altı alan çekilir
+    anlys = await LoadAnalysis(db, jbId, projection = CV_PROMPT_PROJECTION)
+  with performance_monitor.Span("prompt_build"):
+    return _RenderAtsPrompt(anlys, jbId, rawCV, tgtLang)
+
+def _RenderAtsPrompt(anlys: Optional[jobAnalysis], jbId: int, rawCV: str, tgtLang: str) -> str:
+  if( anlys is None ):
     raise ValueError( f"job_id={jbId} için analiz kaydı bulunamadı!" )  
 
-  anlys = jbDc[ "analysis_result" ]
-
-  jbTtl = anlys.get("job_title", "")
-  smry = anlys.get("summary", "")
-  kywds = anlys.get("keywords", [])
-  rsps = anlys.get("responsibilities", [])
-  rqrmnts = anlys.get("requirements", {})
-  bnfts = anlys.get("benefits", [])
-
-  systemPrompt = (
-    "Sen kıdemli bir “ATS Resume Optimizer” yapay zekâsısın.\n"
-    "Girdi JSON’unda üç alan bulunur:\n"
-    "* \"analysis_result\"  → İLAN ANALİZİ\n"
-    "* \"raw_cv\"           → ADAYIN CV’Sİ\n"
-    "* \"target_lang\"      → TR veya EN\n\n"
-    "**AMAÇ**\n"
-    "• CV’yi, ilanın gerektirdiği beceri ve sorumlulukları açıkça vurgulayacak şekilde yeniden düzenle.\n"
-    "• Çıktı yalnızca geçerli, **ATS uyumlu, derlenebilir düz LaTeX CV kodu** olmalı. **Başka hiçbir metin, JSON, markdown çiti veya yorum üretme.**\n"
-    "• **Kesinlikle yalan bilgi ekleme.** Sadece adayın CV’sinde zaten bulunan becerileri veya bunların **doğrudan eş, üst veya alt kavramlarını** kullanabilirsin.\n"
-    "• ATS botlarının okumasını zorlaştıracak hiçbir tasarım unsuru (renk, tablo, çizgi, ikon, grafik vb.) kullanma.\n"
-    "• Çıktıda yalnızca sade LaTeX paketlerini (ör. `article`, `geometry`, `enumitem`) kullan. `xcolor`, `fancyhdr`, `tabularx`, `tikz` gibi görsellik paketleri yasaktır.\n"
-    "**YAPISAL KURALLAR**\n"
-    "• Başlıklar şu sırayla ve İngilizce/Türkçe çevirisine uygun olmalı: \n"
-    "  1. İletişim Bilgileri (Contact Information)\n"
-    "  2. Özet (Summary)\n"
-    "  3. Yetenekler (Skills)\n"
-    "  4. Çalışma Deneyimi (Work Experience)\n"
-    "  5. Eğitim (Education)\n"
-    "• Eğer \"target_lang\":\"TR\" ise LaTeX içeriğinin tamamı Türkçe olacak; özel isimler (ör. şirket adları) hariç İngilizce kullanma.\n"
-    "• Eğer \"target_lang\":\"EN\" ise LaTeX içeriği yalnızca İngilizce olacak; özel isimler hariç Türkçe kullanma.\n"
-    "**ADIMLAR**\n"
-    "1 **İlanı Ayrıştır**\n"
-    "   - `requirements` ve `analysis_result` içindeki tüm anahtar terimleri topla ve normalize et.\n"
-    "2 **CV’yi Ayrıştır**\n"
-    "   - Standart bölümleri (Özet, Deneyim, Eğitim, Yetenekler vb.) tespit et ve normalize et.\n"
-    "3 **Eşleme & Genişletme**\n"
-    "   - CV’deki terimler için eş/üst/alt kavram haritası uygula.\n"
-    "   - İlan terimlerinden sadece CV’de karşılığı olanları veya kavramsal eşleşenleri ekle.\n"
-    "4 **LaTeX Üretimi**\n"
-    "   - Maksimum iki sayfa olacak şekilde gereksiz detayları çıkar.\n"
-    "   - Sadece dolu bölümlerle sade, ATS uyumlu bir LaTeX şablonu üret.\n"
-    "5 **SONUÇ**\n"
-    "   - Yalnızca LaTeX kodunu TEK BLOK olarak döndür; başında veya sonunda hiçbir ekstra karakter, boş satır veya yorum olmasın.\n"
-  )
+  systemPrompt = ATS_SYSTEM_PROMPT
 
   userPrompt = {
-    "analysis_result": {
-      "job_title": jbTtl,
-      "summary": smry,
-      "keywords": kywds,
-      "responsibilities": rsps,
-      "requirements": rqrmnts,
-      "benefits": bnfts
-    },
+    "analysis_result": anlys.PromptFields(),
     "raw_cv": rawCV,
     "target_lang": tgtLang
   }
   userPromptStr = json.dumps(userPrompt, ensure_ascii=False)
   fullPrompt = f"SİSTEM:\n{systemPrompt}\n\nKULLANICI:\n{userPromptStr}"
+  return fullPrompt
+
+def _WriteFile(hpth: str, latexCV: str):
+  with open(hpth, "w", encoding="utf-8") as f:
+    f.write(latexCV)
+
+async def WriteCvOutput(hpth: str, latexCV: str):
+  # Disk yazımı event loop'u bloklamasın diye thread'e taşınır
+  await asyncio.to_thread(_WriteFile, hpth, latexCV)
+  logger.info(f"LaTeX CV {hpth} dosyasına kaydedildi.")
+
+async def GenerateAtsCv(rawCV: str, jbId: int, tgtLang: str, hpth: Optional[str] = None, db: Optional[dbManager] = None):
+  """hpth verilirse sonuç o dosyaya da yazılır; verilmezse yalnızca döndürülür."""
+  cacheKey = CvCacheKey(rawCV, jbId, tgtLang)
+  with performance_monitor.Span("cache_lookup"):
+    cached = await GetCachedCv(cacheKey)
+  if cached:
+    logger.info(f"[CACHE] job_id={jbId} için önbellekteki CV kullanıldı.")
+    if hpth:
+      await WriteCvOutput(hpth, cached)
+    return cached
+
+  fullPrompt = await BuildAtsPrompt(rawCV, jbId, tgtLang, db or sharedDb)
 
   apiSuccess = False
   latexCV = None
@@ -89,9 +134,11 @@ async def GenerateAtsCv(rawCV: str, jbId: int, tgtLang: str, hpth: str = "heb.tx
   for attmpt in range(3):
     try:
       logger.info(f"[API] Mistral API denemesi {attmpt + 1}/3...")
-      rawResult = await GenerateLatexCv(fullPrompt, retries=0)  
+      with performance_monitor.Span("llm_call"):
+        rawResult = await GenerateLatexCv(fullPrompt, retries=0)  
       try:
-        cleanedResult = CleanLatexOutput(rawResult)  
+        with performance_monitor.Span("clean_output"):
+          cleanedResult = CleanLatexOutput(rawResult)  
         latexCV = cleanedResult
         apiSuccess = True
         logger.info("[API] Başarılı ve temizlenmiş LaTeX dökümanı alındı.")
@@ -105,26 +152,115 @@ async def GenerateAtsCv(rawCV: str, jbId: int, tgtLang: str, hpth: str = "heb.tx
 
   if not apiSuccess:
     logger.info("[BROWSER] API başarısız, tarayıcı ile Mistral'a geçiliyor...")
-    client = mistralWebSocketClient(use_browser = True)
-    await client.connect()
-    latexCV = await client.send_message(fullPrompt)
-    await client.disconnect()
+    with performance_monitor.Span("browser_fallback"):
+      client = mistralWebSocketClient(use_browser = True)
+      await client.connect()
+      latexCV = await client.send_message(fullPrompt)
+      await client.disconnect()
 
-  with open(hpth, "w", encoding="utf-8") as f:
-    f.write(latexCV)  
-  logger.info(f"LaTeX CV {hpth} dosyasına kaydedildi.")
+  if latexCV:
+    await StoreCachedCv(cacheKey, latexCV)
+
+  if hpth:
+    await WriteCvOutput(hpth, latexCV)
   return latexCV
 
 
+class latexStreamCleaner:
+  """CleanLatexOutput'un artımlı hali: \\documentclass öncesini atar, sondaki boş/çit satırlarını tutar."""
+  def __init__(self):
+    self.started = False
+    self.buffer = ""
+    self.held = ""
+    self.sep = ""
+
+  def _FindStart(self) -> Optional[int]:
+    pos = 0
+    while True:
+      idx = self.buffer.find("\\documentclass", pos)
+      if idx < 0:
+        return None
+      lineStart = self.buffer.rfind("\n", 0, idx) + 1
+      if self.buffer[lineStart:idx].strip() == "":
+        return idx
+      pos = idx + 1
+
+  def _Start(self) -> bool:
+    start = self._FindStart()
+    if start is None:
+      return False
+    self.started = True
+    self.buffer = self.buffer[start:]
+    return True
+
+  def Feed(self, chunk: str) -> str:
+    self.buffer += chunk
+    if not self.started and not self._Start():
+      return ""
+    cut = self.buffer.rfind("\n")
+    if cut < 0:
+      return ""
+    complete, self.buffer = self.buffer[:cut + 1], self.buffer[cut + 1:]
+    out = []
+    for line in complete.splitlines(keepends = True):
+      if line.strip().strip("`") == "":
+        self.held += line
+      else:
+        # Satır sonu bir sonraki satırla birlikte yazılır; çıktı sonda boşluk bırakmaz
+        out.append(self.sep + self.held + line.rstrip("\r\n"))
+        self.sep = "\n"
+        self.held = ""
+    return "".join(out)
+
+  def Finish(self) -> str:
+    if not self.started and not self._Start():
+      raise ValueError("Geçerli bir LaTeX dökümanı bulunamadı.")
+    tail = self.buffer.rstrip()
+    if tail.endswith("```"):
+      tail = tail[:-3].rstrip()
+    self.buffer = ""
+    return self.sep + self.held + tail if tail else ""
+
+
 def CleanLatexOutput(rawOutput: str) -> str:
-  cleaned = rawOutput.strip()  
-  if( cleaned.startswith("```") and cleaned.endswith("```") ):
-    cleaned = cleaned.strip("`").strip()  
-  lines = cleaned.splitlines()
-  for i, line in enumerate(lines):
-    if ( line.strip().startswith("\\documentclass") ):
-      return "\n".join(lines[i:]).strip()  
-  raise ValueError("Geçerli bir LaTeX dökümanı bulunamadı.")
+  cleaner = latexStreamCleaner()
+  cleaned = cleaner.Feed(rawOutput.strip()) + cleaner.Finish()
+  return cleaned.strip()
+
+
+async def StreamAtsCv(rawCV: str, jbId: int, tgtLang: str, db: Optional[dbManager] = None):
+  """Analiz kaydını hemen doğrular (ValueError), ardından LaTeX parçalarını üreten bir akış döndürür."""
+  cacheKey = CvCacheKey(rawCV, jbId, tgtLang)
+  cached = await GetCachedCv(cacheKey)
+  fullPrompt = None if cached else await BuildAtsPrompt(rawCV, jbId, tgtLang, db or sharedDb)
+
+  async def stream():
+    if cached:
+      yield cached
+      return
+    cleaner = latexStreamCleaner()
+    parts = []
+    try:
+      async for chunk in StreamLatexCv(fullPrompt):
+        out = cleaner.Feed(chunk)
+        if out:
+          parts.append(out)
+          yield out
+      out = cleaner.Finish()
+      if out:
+        parts.append(out)
+        yield out
+    except Exception as e:
+      if parts:
+        logger.error(f"[STREAM] Akış yarıda kesildi: {e}")
+        raise
+      logger.warning(f"[STREAM] Akış başarısız ({e}), tam üretime geçiliyor...")
+      latexCV = await GenerateAtsCv(rawCV, jbId, tgtLang, db = db)
+      yield latexCV
+      return
+    await StoreCachedCv(cacheKey, "".join(parts))
+
+  return stream()
 
 
 def Main():
@@ -135,7 +271,14 @@ def Main():
   parser.add_argument("--target-lang", type = str, choices = ["TR", "EN"], required = True, help = "Hedef dil (TR veya EN)")
   parser.add_argument("--heb-path", type = str, default = "heb.txt", help = "Çıktı dosyası")
   args = parser.parse_args()
-  asyncio.run(GenerateAtsCv(args.raw_cv, args.job_id, args.target_lang, args.heb_path))
+
+  async def run():
+    try:
+      await GenerateAtsCv(args.raw_cv, args.job_id, args.target_lang, args.heb_path)
+    finally:
+      await CloseMistralClient()
+
+  asyncio.run(run())
 
 if( __name__ == "__main__" ):
   Main() 
\ No newline at end of file
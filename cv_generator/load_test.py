@@ -0,0 +1,65 @@
+"""
+load_test.py
+Çalışan API'ye önce tek başına bir CV isteği (taban süre), ardından N eşzamanlı
+istek gönderir ve isteklerin sıraya girip girmediğini ölçer (toplam süre / taban süre).
+Tüm istekler t=0'da gönderildiği için her gecikme kuyruk beklemesini de içerir; bu yüzden
+oran en uzun isteğe değil, tek başına ölçülen isteğe göre hesaplanır.
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+
+import aiohttp
+
+
+async def TimedRequest(session: aiohttp.ClientSession, url: str, body: dict) -> tuple:
+  st = time.monotonic()
+  async with session.post(url, json = body) as resp:
+    await resp.read()
+    return resp.status, time.monotonic() - st
+
+
+async def RunLoadTest(url: str, n: int, job_id: int, same: bool) -> tuple:
+  # Çalıştırma başına nonce: önceki çalıştırmaların CV önbelleği ölçümü bozmasın
+  nonce = uuid.uuid4().hex[:8]
+  bodies = [
+    {"raw_cv": f"Load test CV {nonce}" if same else f"Load test CV {nonce} #{i}", "job_id": job_id, "target_lang": "EN"}
+    for i in range(n)
+  ]
+  solo = {"raw_cv": f"Load test CV {nonce} solo", "job_id": job_id, "target_lang": "EN"}
+  timeout = aiohttp.ClientTimeout(total = None)
+  async with aiohttp.ClientSession(timeout = timeout) as session:
+    _, baseline = await TimedRequest(session, url, solo)
+    st = time.monotonic()
+    results = await asyncio.gather(*[TimedRequest(session, url, b) for b in bodies])
+    wall = time.monotonic() - st
+  return baseline, wall, results
+
+
+def Main():
+  parser = argparse.ArgumentParser(description = "CV üretim uç noktası için eşzamanlılık testi")
+  parser.add_argument("--url", default = "http://localhost:8000/generate-raw-cv")
+  parser.add_argument("-n", "--requests", type = int, default = 10, help = "Eşzamanlı istek sayısı")
+  parser.add_argument("--job-id", type = int, required = True, help = "Analizi bulunan bir iş ilanı ID")
+  parser.add_argument("--same", action = "store_true", help = "Tüm isteklerde aynı CV (single-flight testi)")
+  parser.add_argument("--max-ratio", type = float, default = 2.0,
+                      help = "Toplam süre / tek istek süresi oranı bu değeri aşarsa başarısız")
+  args = parser.parse_args()
+
+  baseline, wall, results = asyncio.run(RunLoadTest(args.url, args.requests, args.job_id, args.same))
+  latencies = [lat for _, lat in results]
+  statuses = {}
+  for status, _ in results:
+    statuses[status] = statuses.get(status, 0) + 1
+  ratio = wall / baseline
+  print(f"İstek: {args.requests}  durumlar: {statuses}")
+  print(f"Tek istek: {baseline:.2f}s  toplam süre: {wall:.2f}s  ortalama: {sum(latencies) / len(latencies):.2f}s  en uzun: {max(latencies):.2f}s")
+  print(f"Sıralama oranı (toplam / tek istek): {ratio:.2f}  (1 ≈ paralel, {args.requests} ≈ tamamen sıralı)")
+  if ratio > args.max_ratio:
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  Main()
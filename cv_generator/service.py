@@ -0,0 +1,25 @@
+import logging
+from typing import Optional
+
+from dbprocess.db_manager import dbManager
+from nlp.utils import singleFlight
+from .generate_ats_cv import CvCacheKey, GenerateAtsCv, StreamAtsCv, WriteCvOutput
+
+logger = logging.getLogger(__name__)
+
+class cvGenerationService:
+  """API ve arka plan işlerinin ortak CV üretim katmanı."""
+  def __init__(self, db: dbManager):
+    self.db = db
+    # Aynı (cv, job, dil) için eşzamanlı istekler tek bir üretimi paylaşır
+    self.flight = singleFlight()
+
+  async def Generate(self, rawCV: str, jbId: int, tgtLang: str, outputPath: Optional[str] = None) -> str:
+    key = CvCacheKey(rawCV, jbId, tgtLang)
+    latexCV = await self.flight.Do(key, lambda: GenerateAtsCv(rawCV, jbId, tgtLang, db = self.db))
+    if outputPath:
+      await WriteCvOutput(outputPath, latexCV)
+    return latexCV
+
+  async def Stream(self, rawCV: str, jbId: int, tgtLang: str):
+    return await StreamAtsCv(rawCV, jbId, tgtLang, db = self.db)
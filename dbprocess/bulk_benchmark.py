@@ -0,0 +1,88 @@
+"""
+bulk_benchmark.py
+Ham iş ilanı yazımını yerel bir mongod'a karşı ölçer: sayfa başına iş kadar
+UpdateOne (eski yol) ile tek BulkUpsert (UpsertJobsAtomic'in yolu) karşılaştırılır.
+Sonuç sayfa/saniye olarak yazılır; ölçüm ayrı bir veritabanında yapılır ve sonunda silinir.
+"""
+import sys
+import time
+import asyncio
+import logging
+import argparse
+from typing import Dict, List
+
+from dbprocess.db_manager import dbManager, MONGODB_URI, MONGODB_DB, BULK_CHUNK_SIZE
+
+BENCH_COLLECTION = "raw_jobs_bench"
+
+
+def SyntheticPage( pNum : int, size : int, overlap : float ) -> List[Dict]:
+  # overlap oranındaki ilanlar önceki sayfayla aynı id'yi taşır (mevcut kayıt / matched yolu)
+  shared = int( size * overlap )
+  jobs = []
+  for i in range( size ):
+    jid = ( pNum - 1 ) * size + i if ( i < shared and pNum > 0 ) else pNum * size + i
+    jobs.append( {
+      "id": jid,
+      "job_title": f"Benchmark job {jid}",
+      "company": f"Company {jid % 97}",
+      "description": "lorem ipsum " * 40,
+      "location": "Istanbul, Turkey",
+      "date_posted": "2026-01-01",
+    } )
+  return jobs
+
+
+async def PerJobUpserts( d : dbManager, pages : List[List[Dict]] ) -> float:
+  st = time.perf_counter()
+  for js in pages:
+    for j in js:
+      await d.UpdateOne( BENCH_COLLECTION, { "_id": j[ "id" ] }, { "$setOnInsert": j }, upsert = True )
+  return time.perf_counter() - st
+
+
+async def BulkUpserts( d : dbManager, pages : List[List[Dict]], chunk : int ) -> float:
+  st = time.perf_counter()
+  for js in pages:
+    await d.BulkUpsert( BENCH_COLLECTION, [ ( { "_id": j[ "id" ] }, { "$setOnInsert": j } ) for j in js ], chunk = chunk )
+  return time.perf_counter() - st
+
+
+async def RunBenchmark( uri : str, dbName : str, nPages : int, size : int, overlap : float, chunk : int ) -> Dict[str, float]:
+  d = dbManager( uri, dbName )
+  pages = [ SyntheticPage( p, size, overlap ) for p in range( nPages ) ]
+  res = {}
+  try:
+    for name, run in ( ( "per_job", lambda: PerJobUpserts( d, pages ) ), ( "bulk", lambda: BulkUpserts( d, pages, chunk ) ) ):
+      await d.db[ BENCH_COLLECTION ].drop()
+      res[ name ] = nPages / await run()
+  finally:
+    await d.clt.drop_database( dbName )
+    d.Close()
+  return res
+
+
+def Main( ):
+  parser = argparse.ArgumentParser( description = "UpsertJobsAtomic yazım yolu için sayfa/saniye ölçümü" )
+  parser.add_argument( "--uri", default = MONGODB_URI )
+  parser.add_argument( "--db", default = "jobscrapper_bench", help = "Ölçüm veritabanı (sonunda silinir)" )
+  parser.add_argument( "-p", "--pages", type = int, default = 20 )
+  parser.add_argument( "--page-size", type = int, default = 200 )
+  parser.add_argument( "--overlap", type = float, default = 0.25, help = "Önceki sayfada zaten olan ilan oranı" )
+  parser.add_argument( "--chunk", type = int, default = BULK_CHUNK_SIZE )
+  args = parser.parse_args()
+
+  logging.basicConfig( level = logging.WARNING )
+  # dbManager her çağrıyı INFO'da loglar; ölçümü log I/O'su bozmasın
+  logging.getLogger( "dbprocess.db_manager" ).setLevel( logging.WARNING )
+  if ( args.db == MONGODB_DB ):
+    print( "Ölçüm veritabanı sonunda silinir; üretim veritabanı adı kullanılamaz." )
+    sys.exit( 2 )
+  res = asyncio.run( RunBenchmark( args.uri, args.db, args.pages, args.page_size, args.overlap, args.chunk ) )
+  print( f"Sayfa: {args.pages} x {args.page_size} iş  (overlap {args.overlap:.0%}, chunk {args.chunk})" )
+  print( f"Önce  (iş başına UpdateOne): {res['per_job']:.2f} sayfa/s" )
+  print( f"Sonra (BulkUpsert):          {res['bulk']:.2f} sayfa/s  ({res['bulk'] / res['per_job']:.1f}x)" )
+
+
+if( __name__ == "__main__" ):
+  Main()
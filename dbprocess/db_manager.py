@@ -2,20 +2,163 @@ import os
 import logging
 from dotenv import load_dotenv  
 import motor.motor_asyncio
-from typing import Any, Dict, List  
-from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne as UpdateOneOp
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError, ExecutionTimeout, OperationFailure, ServerSelectionTimeoutError, WTimeoutError
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple  
+from datetime import datetime, timedelta, timezone
+import asyncio
+import random
+import time
 
 load_dotenv()  
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")  
 MONGODB_DB = os.getenv("MONGODB_DB", "jobscrapper")
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+DB_RETRY_ATTEMPTS = int(os.getenv("DB_RETRY_ATTEMPTS", "4"))
+DB_OP_DEADLINE = float(os.getenv("DB_OP_DEADLINE", "15"))
+# Büyük koleksiyonda indeks oluşturma tek işlem süresini rahatça aşabilir
+DB_INDEX_DEADLINE = float(os.getenv("DB_INDEX_DEADLINE", "600"))
+
+# Geçici sunucu hataları: primary değişimi, kapanış, zaman aşımı, ağ/kilit çakışması vb.
+TRANSIENT_CODES = { 6, 7, 50, 89, 91, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436 }
+# Bu kodlarda sunucu işlemi uygulamadan reddetmiştir; yazmalar için de tekrar güvenlidir
+NOT_APPLIED_CODES = { 91, 189, 10107, 11600, 11602, 13435, 13436 }
 
 logging.basicConfig(level = logging.INFO)  
 logger = logging.getLogger(__name__)
 
+# Sıcak sorguların dayandığı indeksler: koleksiyon -> [(anahtarlar, seçenekler)]
+INDEXES = {
+  "raw_jobs": [
+    ( [ ("processed", 1), ("lease_until", 1) ], {} ),
+  ],
+  "job_analysis_results": [
+    ( [ ("job_id", 1) ], { "unique": True } ),
+  ],
+  "successhttps": [
+    ( [ ("proxy", 1) ], {} ),
+    ( [ ("added_at", 1) ], {} ),
+  ],
+  "successlinkedin": [
+    ( [ ("proxy", 1) ], {} ),
+    ( [ ("added_at", 1) ], {} ),
+  ],
+  "jobscraper": [
+    ( [ ("tokens_used", 1) ], {} ),
+    ( [ ("created_at", 1) ], {} ),
+  ],
+  "job_fingerprints": [
+    ( [ ("bands", 1) ], {} ),
+  ],
+  "extraction_cache": [
+    ( [ ("created_at", 1) ], { "expireAfterSeconds": int(os.getenv("EXTRACTION_CACHE_TTL_DAYS", "30")) * 86400 } ),
+  ],
+  "cv_jobs": [
+    ( [ ("created_at", 1) ], { "expireAfterSeconds": int(os.getenv("CV_JOB_TTL_HOURS", "24")) * 3600 } ),
+  ],
+  "cv_cache": [
+    ( [ ("created_at", 1) ], { "expireAfterSeconds": int(os.getenv("CV_CACHE_TTL_DAYS", "7")) * 86400 } ),
+  ],
+  "scheduler_locks": [
+    ( [ ("expires_at", 1) ], { "expireAfterSeconds": 0 } ),
+  ],
+}
+
+class dbError(Exception):
+  pass
+
+class dbUnavailableError(dbError):
+  """Geçici hata tekrar denemelerle aşılamadı; işlem uygulanmış olabilir de olmayabilir de."""
+  pass
+
+def IsTransient( exc : Exception ) -> bool:
+  if isinstance( exc, ( BulkWriteError, DuplicateKeyError ) ):
+    return False
+  if isinstance( exc, ( ConnectionFailure, ExecutionTimeout, WTimeoutError ) ):
+    return True
+  if isinstance( exc, OperationFailure ):
+    return exc.has_error_label( "RetryableWriteError" ) or exc.code in TRANSIENT_CODES
+  return False
+
+def IsRetryable( exc : Exception, idempotent : bool = True ) -> bool:
+  # Yazmalarda bağlantı kopması belirsizdir (işlem uygulanmış olabilir); yalnızca gönderilmediği kesin hatalar tekrarlanır
+  if not IsTransient( exc ):
+    return False
+  if idempotent:
+    return True
+  if isinstance( exc, ServerSelectionTimeoutError ):
+    return True
+  return isinstance( exc, OperationFailure ) and ( exc.has_error_label( "RetryableWriteError" ) or exc.code in NOT_APPLIED_CODES )
+
+class retryPolicy:
+  """
+  Geçici hataları tam jitter'lı üstel bekleme ile tekrarlar; deneme ya da süre bütçesi bitince dbUnavailableError fırlatır.
+  Süre bütçesi tek tek denemeleri de sınırlar: takılan bir işlem kalan süre dolunca iptal edilir.
+  """
+  def __init__( self, attempts : int = DB_RETRY_ATTEMPTS, base_delay : float = 0.1, max_delay : float = 2.0, deadline : float = DB_OP_DEADLINE ):
+    self.attempts = max( 1, attempts )
+    self.base_delay = base_delay
+    self.max_delay = max_delay
+    self.deadline = deadline
+
+  async def Run( self, op : str, fn : Callable[[], Awaitable[Any]], idempotent : bool = True, deadline : float = None ) -> Any:
+    deadline = deadline or self.deadline
+    start = time.monotonic()
+    attempt = 0
+    while True:
+      attempt += 1
+      remaining = deadline - ( time.monotonic() - start )
+      try:
+        try:
+          return await asyncio.wait_for( fn(), max( 0.001, remaining ) )
+        except asyncio.TimeoutError as exc:
+          # İptal edilen işlem sunucuda uygulanmış olabilir; yazmalarda da sonuç belirsizdir
+          raise dbUnavailableError( f"{op} exceeded its {deadline:g}s deadline (attempt {attempt})" ) from exc
+      except dbUnavailableError:
+        raise
+      except Exception as exc:
+        if not IsTransient( exc ):
+          raise
+        if not IsRetryable( exc, idempotent ):
+          raise dbUnavailableError( f"{op} failed with an ambiguous transient error: {exc}" ) from exc
+        delay = random.uniform( 0, min( self.max_delay, self.base_delay * 2 ** ( attempt - 1 ) ) )
+        if attempt >= self.attempts or time.monotonic() - start + delay > deadline:
+          raise dbUnavailableError( f"{op} failed after {attempt} attempts: {exc}" ) from exc
+        logger.warning( f"Transient error on {op} (attempt {attempt}/{self.attempts}), retrying in {delay:.2f}s: {exc}" )
+        await asyncio.sleep( delay )
+
 class dbManager:
-  def __init__( self, uri : str, dbName : str ):
-    self.clt = motor.motor_asyncio.AsyncIOMotorClient( uri )  
+  def __init__( self, uri : str, dbName : str, maxPool : int = MONGODB_MAX_POOL_SIZE, minPool : int = MONGODB_MIN_POOL_SIZE, retry : retryPolicy = None ):
+    self.clt = motor.motor_asyncio.AsyncIOMotorClient( uri, maxPoolSize = maxPool, minPoolSize = minPool, serverSelectionTimeoutMS = MONGODB_SERVER_SELECTION_TIMEOUT_MS )  
     self.db = self.clt[ dbName ]
+    self.idxReady = False
+    self.retry = retry or retryPolicy()
+
+  async def _Call( self, op : str, c : str, fn : Callable[[], Awaitable[Any]], idempotent : bool = True, deadline : float = None ) -> Any:
+    return await self.retry.Run( f"{op} on {c}", fn, idempotent, deadline )
+
+  def Close( self ):
+    self.clt.close()  
+    logger.info( "MongoDB client closed." )  
+
+  async def EnsureIndexes( self ):
+    if ( self.idxReady ):
+      return
+    ok = True
+    for c, specs in INDEXES.items():
+      for keys, opts in specs:
+        try:
+          await self._Call( "create_index", c, lambda: self.db[ c ].create_index( keys, **opts ), deadline = DB_INDEX_DEADLINE )  
+        except Exception as exc:  
+          if isinstance( exc, dbUnavailableError ):
+            ok = False
+          logger.error( f"Failed to ensure index {keys} on {c}: {exc}" )  
+    logger.info( "Indexes ensured." )  
+    # Bağlantı kaynaklı hatada bir sonraki çağrıda tekrar denenir
+    self.idxReady = ok
 
   
   async def InsertMany( self, col : str, docs : List[Dict[str, Any]] ):
@@ -26,8 +169,10 @@ class dbManager:
       clnDocs.append( d )  
     if ( clnDocs ):
       try:
-        await self.db[ col ].insert_many( clnDocs )  
+        await self._Call( "insert_many", col, lambda: self.db[ col ].insert_many( clnDocs ), idempotent = False )  
         logger.info( f"Inserted {len(clnDocs)} documents into {col}." )  
+      except dbUnavailableError:
+        raise
       except Exception as exc:  
         logger.error( f"Failed to insert many into {col}: {exc}" )  
 
@@ -35,85 +180,258 @@ class dbManager:
     d = dict( doc )  
     d.pop('_id', None)  
     try:  
-      await self.db[ col ].insert_one( d )
+      await self._Call( "insert_one", col, lambda: self.db[ col ].insert_one( d ), idempotent = False )
       logger.info( f"Inserted one document into {col}." )  
+    except dbUnavailableError:
+      raise
     except Exception as exc:  
       logger.error( f"Failed to insert one into {col}: {exc}" )  
 
-  async def FindMany( self, c : str, q : Dict[str, Any], lim : int = 0 ) -> List[Dict[str, Any]]:
-    try:  
-      cur = self.db[ c ].find( q )
+  async def FindMany( self, c : str, q : Dict[str, Any], lim : int = 0, projection : Dict[str, Any] = None ) -> List[Dict[str, Any]]:
+    def Fetch():
+      cur = self.db[ c ].find( q, projection )
       if( lim > 0 ):
         cur = cur.limit( lim )  
-      res = await cur.to_list( length = lim or 1000 )  
+      return cur.to_list( length = lim or None )
+    try:  
+      res = await self._Call( "find", c, Fetch )  
       logger.info( f"Found {len(res)} documents in {c}." )  
       return res  
+    except dbUnavailableError:
+      raise
     except Exception as exc:  
       logger.error( f"Failed to find many in {c}: {exc}" )  
       return []  
 
-  async def FindOne( self, c : str, q : Dict[str, Any], s : list = None ) -> Dict[str, Any]:
-    try:  
-      cur = self.db[ c ].find( q )  
+  async def Stream( self, c : str, q : Dict[str, Any], projection : Dict[str, Any] = None, batch_size : int = 500, lim : int = 0 ) -> AsyncIterator[Dict[str, Any]]:
+    # Belgeleri listede biriktirmeden batch_size'lık getMore'larla sırayla verir; bellek sabit kalır.
+    # İlk batch tekrar denenir; akış ortasındaki geçici hata, kısmi sonuç tam sanılmasın diye fırlatılır.
+    cur = None
+    async def Open():
+      nonlocal cur
+      if cur is not None:
+        await cur.close()
+      cur = self.db[ c ].find( q, projection, batch_size = batch_size )
+      if( lim > 0 ):
+        cur = cur.limit( lim )
+      try:
+        return await cur.__anext__()
+      except StopAsyncIteration:
+        return None
+    cnt = 0
+    try:
+      first = await self._Call( "find", c, Open )
+      if first is not None:
+        cnt += 1
+        yield first
+        async for doc in cur:
+          cnt += 1
+          yield doc
+    except dbUnavailableError:
+      raise
+    except Exception as exc:
+      if IsTransient( exc ):
+        raise dbUnavailableError( f"Stream from {c} broke after {cnt} documents: {exc}" ) from exc
+      logger.error( f"Failed to stream from {c} after {cnt} documents: {exc}" )
+    finally:
+      if cur is not None:
+        await cur.close()
+    logger.info( f"Streamed {cnt} documents from {c}." )
+
+  async def FindOne( self, c : str, q : Dict[str, Any], s : list = None, projection : Dict[str, Any] = None ) -> Dict[str, Any]:
+    def Fetch():
+      cur = self.db[ c ].find( q, projection )  
       if (s):
         cur = cur.sort( s )  
-      res = await cur.to_list( length = 1 )  
+      return cur.to_list( length = 1 )
+    try:  
+      res = await self._Call( "find", c, Fetch )  
       if ( res ):
         logger.info( f"Found one document in {c}." )  
         return res[0]  
       else:
         logger.info( f"No document found in {c}." )  
         return None  
+    except dbUnavailableError:
+      raise
     except Exception as exc:  
       logger.error( f"Failed to find one in {c}: {exc}" )  
       return None  
 
+  async def Exists( self, c : str, q : Dict[str, Any] ) -> bool:
+    # Yalnızca _id döner; varlık kontrolü için belge gövdesi taşınmaz.
+    # "Yok" cevabı pahalı işleri tetiklediği için hata False'a çevrilmez, fırlatılır.
+    try:  
+      res = await self._Call( "find_one", c, lambda: self.db[ c ].find_one( q, { "_id": 1 } ) )  
+      return res is not None  
+    except dbError:
+      raise
+    except Exception as exc:  
+      raise dbError( f"Failed to check existence in {c}: {exc}" ) from exc
+
   async def UpdateOne( self, c : str, q : Dict[str, Any], update : Dict[str, Any], upsert : bool = False ):
     try:  
-      res = await self.db[ c ].update_one( q, update, upsert = upsert )  
+      res = await self._Call( "update_one", c, lambda: self.db[ c ].update_one( q, update, upsert = upsert ), idempotent = False )  
       logger.info( f"Updated one document in {c}." )  
       return res  
+    except dbUnavailableError:
+      raise
     except Exception as exc:  
       logger.error( f"Failed to update one in {c}: {exc}" )  
       return None  
 
+  async def UpdateMany( self, c : str, q : Dict[str, Any], update : Dict[str, Any] ):
+    try:  
+      res = await self._Call( "update_many", c, lambda: self.db[ c ].update_many( q, update ), idempotent = False )  
+      logger.info( f"Updated {res.modified_count} documents in {c}." )  
+      return res  
+    except dbUnavailableError:
+      raise
+    except Exception as exc:  
+      logger.error( f"Failed to update many in {c}: {exc}" )  
+      return None  
+
+  async def FindOneAndUpdate( self, c : str, q : Dict[str, Any], update : Dict[str, Any], s : list = None, after : bool = False, projection : Dict[str, Any] = None ) -> Dict[str, Any]:
+    try:  
+      ret = ReturnDocument.AFTER if after else ReturnDocument.BEFORE
+      res = await self._Call( "find_one_and_update", c, lambda: self.db[ c ].find_one_and_update( q, update, projection = projection, sort = s, return_document = ret ), idempotent = False )  
+      return res  
+    except dbUnavailableError:
+      raise
+    except Exception as exc:  
+      logger.error( f"Failed to find and update one in {c}: {exc}" )  
+      return None  
+
+  def Watch( self, c : str, pipeline : List[Dict[str, Any]], resume_after : Any = None, max_await_ms : int = 5000 ):
+    # Change stream yalnızca replica set / sharded cluster üzerinde çalışır (standalone'da OperationFailure 40573)
+    return self.db[ c ].watch( pipeline, resume_after = resume_after, max_await_time_ms = max_await_ms )
+
+  async def BulkWrite( self, c : str, reqs : List[Any], chunk : int = BULK_CHUNK_SIZE ) -> List[Dict[str, int]]:
+    # Hazır pymongo yazma operasyonlarını sırasız bulk_write ile parça parça yazar
+    stats = []
+    chunk = max( 1, chunk )
+    for i in range( 0, len( reqs ), chunk ):
+      part = reqs[ i:i + chunk ]
+      st = { "inserted": 0, "upserted": 0, "matched": 0, "modified": 0, "deleted": 0, "errors": 0 }
+      try:
+        res = await self._Call( "bulk_write", c, lambda: self.db[ c ].bulk_write( part, ordered = False ), idempotent = False )
+        st[ "inserted" ] = res.inserted_count
+        st[ "upserted" ] = res.upserted_count
+        st[ "matched" ] = res.matched_count
+        st[ "modified" ] = res.modified_count
+        st[ "deleted" ] = res.deleted_count
+      except BulkWriteError as bwe:
+        det = bwe.details or {}
+        st[ "inserted" ] = det.get( "nInserted", 0 )
+        st[ "upserted" ] = det.get( "nUpserted", 0 )
+        st[ "matched" ] = det.get( "nMatched", 0 )
+        st[ "modified" ] = det.get( "nModified", 0 )
+        st[ "deleted" ] = det.get( "nRemoved", 0 )
+        st[ "errors" ] = len( det.get( "writeErrors", [] ) )
+        logger.error( f"Bulk write into {c} had {st['errors']} write errors." )
+      except dbUnavailableError:
+        raise
+      except Exception as exc:
+        st[ "errors" ] = len( part )
+        logger.error( f"Failed to bulk write into {c}: {exc}" )
+      logger.info( f"Bulk write chunk into {c}: {len( part )} ops, {st['errors']} errors." )
+      stats.append( st )
+    return stats
+
+  async def BulkUpsert( self, c : str, ops : List[Tuple[Dict[str, Any], Dict[str, Any]]], chunk : int = BULK_CHUNK_SIZE ) -> List[Dict[str, int]]:
+    # (query, update) çiftlerini upsert olarak yazar
+    return await self.BulkWrite( c, [ UpdateOneOp( q, u, upsert = True ) for q, u in ops ], chunk )
+
   async def DeleteOne( self, c : str, q : Dict[str, Any] ):
     try:  
-      await self.db[ c ].delete_one( q )  
+      await self._Call( "delete_one", c, lambda: self.db[ c ].delete_one( q ) )  
       logger.info( f"Deleted one document from {c}." )  
+    except dbUnavailableError:
+      raise
     except Exception as exc:  
       logger.error( f"Failed to delete one from {c}: {exc}" )  
 
   async def DeleteMany( self, c : str, q : Dict[str, Any] ):
     try:  
-      await self.db[ c ].delete_many( q )  
+      await self._Call( "delete_many", c, lambda: self.db[ c ].delete_many( q ) )  
       logger.info( f"Deleted many documents from {c}." )  
+    except dbUnavailableError:
+      raise
     except Exception as exc:  
       logger.error( f"Failed to delete many from {c}: {exc}" )  
 
   async def GetColCount( self, c : str ) -> int:
     try:  
-      cnt = await self.db[ c ].count_documents( {} )  
+      cnt = await self._Call( "count_documents", c, lambda: self.db[ c ].count_documents( {} ) )  
       logger.info( f"Collection {c} has {cnt} documents." )  
       return cnt  
+    except dbUnavailableError:
+      raise
     except Exception as exc:  
       logger.error( f"Failed to count documents in {c}: {exc}" )  
       return 0  
 
   async def RemoveOldProx( self, c : str, cut : datetime ) -> int:
     try:  
-      res = await self.db[ c ].delete_many( { "added_at": { "$lt": cut } } )  
+      res = await self._Call( "delete_many", c, lambda: self.db[ c ].delete_many( { "added_at": { "$lt": cut } } ) )  
       logger.info( f"Removed {res.deleted_count} old proxies from {c}." )  
       return res.deleted_count  
+    except dbUnavailableError:
+      raise
     except Exception as exc:  
       logger.error( f"Failed to remove old proxies from {c}: {exc}" )  
       return 0  
 
   async def UpdateProxyTs( self, c : str, p : str ):
     try:  
-      await self.db[ c ].update_one( { "proxy": p }, { "$set": { "last_tested": datetime.now() } }, upsert = True )  
+      await self._Call( "update_one", c, lambda: self.db[ c ].update_one( { "proxy": p }, { "$set": { "last_tested": datetime.now() } }, upsert = True ) )  
       logger.info( f"Updated proxy timestamp for {p} in {c}." )  
+    except dbUnavailableError:
+      raise
     except Exception as exc:  
       logger.error( f"Failed to update proxy timestamp for {p} in {c}: {exc}" )  
 
-db = dbManager( MONGODB_URI, MONGODB_DB ) 
\ No newline at end of file
+  async def AcquireLock( self, c : str, key : str, owner : str, ttl : float ) -> bool:
+    # Süresi dolmuş ya da zaten bizde olan kilit alınır; başkasındaysa upsert _id çakışmasıyla düşer.
+    # Zamanlar UTC: Mongo naive datetime'ı UTC sayar, TTL monitörü ve farklı saat dilimindeki kopyalar tutarlı kalır
+    now = datetime.now( timezone.utc )
+    try:
+      await self._Call( "update_one", c, lambda: self.db[ c ].update_one(
+        { "_id": key, "$or": [ { "expires_at": { "$lt": now } }, { "owner": owner } ] },
+        { "$set": { "owner": owner, "acquired_at": now, "expires_at": now + timedelta( seconds = ttl ) } },
+        upsert = True
+      ) )
+      logger.info( f"Acquired lock {key} in {c}." )
+      return True
+    except DuplicateKeyError:
+      return False
+    except dbUnavailableError:
+      raise
+    except Exception as exc:
+      logger.error( f"Failed to acquire lock {key} in {c}: {exc}" )
+      return False
+
+  async def RenewLock( self, c : str, key : str, owner : str, ttl : float ) -> bool:
+    try:
+      res = await self._Call( "update_one", c, lambda: self.db[ c ].update_one(
+        { "_id": key, "owner": owner },
+        { "$set": { "expires_at": datetime.now( timezone.utc ) + timedelta( seconds = ttl ) } }
+      ) )
+      return res.matched_count == 1
+    except dbUnavailableError:
+      raise
+    except Exception as exc:
+      logger.error( f"Failed to renew lock {key} in {c}: {exc}" )
+      return False
+
+  async def ReleaseLock( self, c : str, key : str, owner : str ):
+    try:
+      await self._Call( "delete_one", c, lambda: self.db[ c ].delete_one( { "_id": key, "owner": owner } ) )
+      logger.info( f"Released lock {key} in {c}." )
+    except dbUnavailableError:
+      raise
+    except Exception as exc:
+      logger.error( f"Failed to release lock {key} in {c}: {exc}" )
+
+# Süreç genelinde paylaşılan tek istemci; yeni dbManager yalnızca farklı bir veritabanı için oluşturulmalı
+db = dbManager( MONGODB_URI, MONGODB_DB )
@@ -0,0 +1,69 @@
+import sys
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from dbprocess.db_manager import db
+
+logger = logging.getLogger(__name__)
+
+# (koleksiyon, sorgu, sıralama) - dbManager çağıranlarının sıcak sorguları
+def HotQueries( ) -> List[tuple]:
+  now = datetime.now( timezone.utc )
+  return [
+    ( "job_analysis_results", { "job_id": 0 }, None ),
+    ( "raw_jobs", { "processed": { "$ne": True } }, None ),
+    ( "raw_jobs", {
+        "processed": { "$ne": True },
+        "$or": [ { "lease_until": { "$exists": False } }, { "lease_until": None }, { "lease_until": { "$lt": now } } ]
+      }, [ ("_id", 1) ] ),
+    ( "successhttps", { "proxy": "127.0.0.1:80" }, None ),
+    ( "successlinkedin", { "proxy": "127.0.0.1:80" }, None ),
+    ( "successhttps", { "added_at": { "$lt": now } }, None ),
+    ( "successlinkedin", { "added_at": { "$lt": now } }, None ),
+    ( "jobscraper", { "$expr": { "$lt": [ "$tokens_used", "$token_limit" ] } }, [ ("tokens_used", 1) ] ),
+    ( "jobscraper", { "created_at": { "$lt": now } }, None ),
+  ]
+
+
+def PlanStages( plan : Dict[str, Any] ) -> List[str]:
+  stages = []
+  if ( not isinstance( plan, dict ) ):
+    return stages
+  if ( "stage" in plan ):
+    stages.append( plan[ "stage" ] )
+  for key in ( "inputStage", "queryPlan" ):
+    stages.extend( PlanStages( plan.get( key ) ) )
+  for sub in plan.get( "inputStages", [] ):
+    stages.extend( PlanStages( sub ) )
+  return stages
+
+
+async def AuditQueries( ) -> int:
+  await db.EnsureIndexes()
+  failures = 0
+  for c, q, s in HotQueries():
+    cur = db.db[ c ].find( q )
+    if ( s ):
+      cur = cur.sort( s )
+    exp = await cur.explain()
+    stages = PlanStages( exp.get( "queryPlanner", {} ).get( "winningPlan", {} ) )
+    status = "COLLSCAN" if "COLLSCAN" in stages else "OK"
+    if ( status != "OK" ):
+      failures += 1
+    print( f"[{status}] {c} {q} -> {' > '.join(stages)}" )
+  return failures
+
+
+def Main( ):
+  logging.basicConfig( level = logging.WARNING )
+  failures = asyncio.run( AuditQueries() )
+  if ( failures ):
+    print( f"{failures} sorgu COLLSCAN kullanıyor." )
+    sys.exit( 1 )
+  print( "Tüm sıcak sorgular indeks kullanıyor." )
+
+
+if( __name__ == "__main__" ):
+  Main()
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from dbprocess.db_manager import dbManager, BULK_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+class writeBehindBuffer:
+  """
+  Tek koleksiyona giden pymongo yazma operasyonlarını (InsertOne, UpdateOne, DeleteOne...)
+  toplar ve `max_ops` adede ya da `max_delay` saniyeye ulaşınca tek bulk_write ile yazar.
+  Yazılmayı bekleyen operasyon sayısı `max_pending`'e ulaşınca Add bekler (backpressure).
+  Yazılamayan parçalar kaybolmaz: kuyruğun başına geri konur ve hata Flush'ı çağırana
+  (Add/Close) iletilir; Close uçuştaki flush'ın bitmesini bekleyip kalanı yazar.
+
+    async with writeBehindBuffer( db, "successlinkedin" ) as buf:
+      await buf.Add( UpdateOne( { "proxy": p }, { "$set": doc }, upsert = True ) )
+  """
+  def __init__( self, db : dbManager, col : str, max_ops : int = BULK_CHUNK_SIZE, max_delay : float = 1.0, max_pending : int = 5000 ):
+    self.db = db
+    self.col = col
+    self.max_ops = max( 1, max_ops )
+    self.max_delay = max_delay
+    self.ops : List[Any] = []
+    self.slots = asyncio.Semaphore( max( self.max_ops, max_pending ) )
+    self.flush_lock = asyncio.Lock()
+    self.timer : Optional[asyncio.Task] = None
+    self.stopping = asyncio.Event()
+    self.stats : Dict[str, int] = { "inserted": 0, "upserted": 0, "matched": 0, "modified": 0, "deleted": 0, "errors": 0 }
+
+  async def __aenter__( self ):
+    self.Start()
+    return self
+
+  async def __aexit__( self, exc_type, exc, tb ):
+    await self.Close()
+
+  def Start( self ):
+    if self.timer is None:
+      self.stopping.clear()
+      self.timer = asyncio.create_task( self._FlushLoop() )
+
+  async def Add( self, op : Any ):
+    await self.slots.acquire()
+    self.ops.append( op )
+    if len( self.ops ) >= self.max_ops:
+      await self.Flush()
+
+  async def Flush( self ):
+    async with self.flush_lock:
+      if not self.ops:
+        return
+      ops, self.ops = self.ops, []
+      done = 0
+      try:
+        for i in range( 0, len( ops ), self.max_ops ):
+          part = ops[ i:i + self.max_ops ]
+          for st in await self.db.BulkWrite( self.col, part, len( part ) ):
+            for key, val in st.items():
+              self.stats[ key ] = self.stats.get( key, 0 ) + val
+          done = i + len( part )
+          for _ in part:
+            self.slots.release()
+      except BaseException:
+        # Yazılamayan parça ve sonrası (iptal dahil) sonraki flush için başa geri konur
+        self.ops[ :0 ] = ops[ done: ]
+        raise
+
+  async def Close( self ):
+    # Son flush: zamanlayıcı iptal edilmez, durması istenir; uçuştaki flush yarıda kesilmez.
+    # Kalan operasyonlar yazılır, yazılamazlarsa hata çağırana fırlatılır
+    if self.timer is not None:
+      self.stopping.set()
+      await asyncio.gather( self.timer, return_exceptions = True )
+      self.timer = None
+    await self.Flush()
+    logger.info( f"Write-behind buffer for {self.col} closed: {self.stats}" )
+
+  async def _FlushLoop( self ):
+    while not self.stopping.is_set():
+      try:
+        await asyncio.wait_for( self.stopping.wait(), self.max_delay )
+        return
+      except asyncio.TimeoutError:
+        pass
+      try:
+        await self.Flush()
+      except Exception as exc:
+        logger.error( f"Write-behind flush for {self.col} failed, will retry: {exc}" )
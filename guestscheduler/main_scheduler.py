@@ -1,15 +1,15 @@
 import os
 import logging
 import asyncio
-import subprocess
-import functools
 from datetime import datetime, timedelta
 
 import pymongo
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.jobstores.mongodb import MongoDBJobStore
 from apscheduler.triggers.interval import IntervalTrigger
-from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
+from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES
+
+from guestscheduler.tasks import task_registry
 
 # Logger
 logging.basicConfig(level=logging.INFO)
@@ -27,30 +27,28 @@ jobstores = {
                                collection='apscheduler_jobs',
                                host=MONGODB_URI)
 }
-scheduler = AsyncIOScheduler(jobstores=jobstores, timezone="UTC")
-
-async def run_command_async(cmd: str) -> int:
-    logger.info(f"Komut çalıştırılıyor: {cmd}")
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(
-        None,
-        functools.partial(subprocess.run, cmd, shell=True, check=False, capture_output=True, text=True)
-    )
-    logger.info(f"Komut bitti (exit={result.returncode}): {result.stdout} {result.stderr}")
-    return result.returncode
+# Aynı job üst üste binmez; kaçırılan tetiklemeler tek çalıştırmada birleştirilir
+job_defaults = {
+    'max_instances': 1,
+    'coalesce': True,
+    'misfire_grace_time': int(os.getenv("SCHEDULER_MISFIRE_GRACE", "300"))
+}
+scheduler = AsyncIOScheduler(jobstores=jobstores, job_defaults=job_defaults, timezone="UTC")
 
 async def proxy_monitor():
-    await run_command_async("python -m proxies.manager --monitor --linkedin-interval 1")
+    await task_registry.Run("proxy_monitor")
 
 async def token_requester_and_job_processor():
-    ret = await run_command_async("python -m job_scrapers.token_requester")
-    if ret == 0:
-        await run_command_async("python -m nlp.job_processor --batch-size 5 --max-retries 2")
-    else:
+    try:
+        ran = await task_registry.Run("token_requester")
+    except Exception:
         logger.error("token_requester başarısız oldu, job_processor çalıştırılmadı.")
+        raise
+    if ran:
+        await task_registry.Run("job_processor")
 
 async def signup():
-    await run_command_async("python -m job_scrapers.signup")
+    await task_registry.Run("signup")
 
 async def cleanup_old_proxies():
     try:
@@ -68,6 +66,12 @@ def job_listener(event):
     else:
         logger.info(f"Job {event.job_id} başarıyla çalıştı")
 
+def job_skipped_listener(event):
+    if event.code == EVENT_JOB_MAX_INSTANCES:
+        logger.warning(f"Job {event.job_id} önceki çalıştırması sürdüğü için atlandı")
+    else:
+        logger.warning(f"Job {event.job_id} tetikleme zamanı kaçırıldı")
+
 def start_scheduler():
     """
     Job'ları planlayıp scheduler'ı başlatır. ID çakışmalarını önlemek için replace_existing=True kullanır.
@@ -75,6 +79,7 @@ def start_scheduler():
     scheduler.add_job(token_requester_and_job_processor,
                       trigger=IntervalTrigger(hours=24),
                       id="token_and_jobproc",
+                      misfire_grace_time=6 * 3600,
                       replace_existing=True)
     scheduler.add_job(signup,
                       trigger=IntervalTrigger(hours=6),
@@ -89,6 +94,7 @@ def start_scheduler():
                       id="proxy_monitor",
                       replace_existing=True)
     scheduler.add_listener(job_listener, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+    scheduler.add_listener(job_skipped_listener, EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
     scheduler.start()
     logger.info("Scheduler başlatıldı ve iş planları oluşturuldu.")
 
@@ -97,6 +103,7 @@ async def shutdown_scheduler():
     Scheduler'ı düzgün şekilde kapatır.
     """
     try:
+        await task_registry.CancelAll()
         if scheduler.running:
             scheduler.shutdown(wait=False)
             logger.info("Scheduler kapatıldı.")
@@ -0,0 +1,163 @@
+import os
+import sys
+import time
+import socket
+import secrets
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict
+
+from dbprocess.db_manager import db, dbError, dbManager
+from job_scrapers.token_requester import jobScraper
+from nlp.job_processor import jobProcessor
+from proxies.manager import ProxyManager
+
+logger = logging.getLogger(__name__)
+
+LOCK_COLLECTION = "scheduler_locks"
+
+
+class taskFailed(Exception):
+    pass
+
+
+@dataclass
+class registeredTask:
+    name: str
+    factory: Callable[[], Awaitable]
+    timeout: float
+
+
+class taskRegistry:
+    """
+    Scheduler görevlerini adlarıyla tutar; her çalıştırma zaman aşımıyla sınırlanır,
+    görev adı başına Mongo kilidiyle API kopyaları arasında tekilleştirilir ve
+    çalışan görevler isimleriyle iptal edilebilir.
+    """
+    def __init__(self, db: dbManager, lock_ttl: float = 300):
+        self.db = db
+        self.lock_ttl = lock_ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(3)}"
+        self.tasks: Dict[str, registeredTask] = {}
+        self.running: Dict[str, asyncio.Task] = {}
+
+    def Register(self, name: str, factory: Callable[[], Awaitable], timeout: float):
+        self.tasks[name] = registeredTask(name, factory, timeout)
+
+    async def _LockHeartbeat(self, name: str, task: asyncio.Task):
+        while True:
+            await asyncio.sleep(max(1, self.lock_ttl / 3))
+            try:
+                renewed = await self.db.RenewLock(LOCK_COLLECTION, name, self.owner, self.lock_ttl)
+            except dbError as exc:
+                logger.error(f"Görev kilidi yenilenemedi: {name}: {exc}")
+                renewed = False
+            if not renewed:
+                logger.error(f"Görev kilidi kaybedildi, iptal ediliyor: {name}")
+                task.cancel()
+                return
+
+    async def Run(self, name: str) -> bool:
+        """Görevi çalıştırır; başka bir yerde zaten çalışıyorsa atlar ve False döner."""
+        spec = self.tasks[name]
+        if name in self.running:
+            logger.warning(f"Görev zaten bu süreçte çalışıyor, atlandı: {name}")
+            return False
+        if not await self.db.AcquireLock(LOCK_COLLECTION, name, self.owner, self.lock_ttl):
+            logger.warning(f"Görev başka bir kopyada çalışıyor, atlandı: {name}")
+            return False
+        current = asyncio.current_task()
+        self.running[name] = current
+        heartbeat = asyncio.create_task(self._LockHeartbeat(name, current))
+        start = time.monotonic()
+        logger.info(f"Görev başladı: {name} (zaman aşımı {spec.timeout:.0f}s)")
+        try:
+            await asyncio.wait_for(spec.factory(), timeout=spec.timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Görev zaman aşımına uğradı: {name} ({spec.timeout:.0f}s)")
+            raise
+        except asyncio.CancelledError:
+            logger.warning(f"Görev iptal edildi: {name}")
+            raise
+        finally:
+            heartbeat.cancel()
+            self.running.pop(name, None)
+            try:
+                await self.db.ReleaseLock(LOCK_COLLECTION, name, self.owner)
+            except dbError as exc:
+                # Kilit TTL ile zaten düşer; asıl hatanın üstüne yazılmaz
+                logger.error(f"Görev kilidi bırakılamadı: {name}: {exc}")
+        logger.info(f"Görev bitti: {name} ({time.monotonic() - start:.1f}s)")
+        return True
+
+    def Cancel(self, name: str) -> bool:
+        task = self.running.get(name)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    async def CancelAll(self):
+        tasks = [task for task in self.running.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def RunModule(module: str, *args: str):
+    """
+    İçe aktarılırken yan etki üreten modüller için: `python -m module` alt süreci,
+    çıktısı satır satır loglara akıtılır; iptalde süreç sonlandırılır.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", module, *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+        limit=1024 * 1024
+    )
+    try:
+        async for line in proc.stdout:
+            logger.info(f"[{module}] {line.decode(errors='replace').rstrip()}")
+        code = await proc.wait()
+    except asyncio.CancelledError:
+        proc.terminate()
+        try:
+            await asyncio.wait_for(proc.wait(), timeout=10)
+        except asyncio.TimeoutError:
+            proc.kill()
+        raise
+    if code != 0:
+        raise taskFailed(f"{module} {code} çıkış koduyla bitti")
+
+
+async def RunTokenRequester():
+    await jobScraper().RunScraper()
+
+
+async def RunJobProcessor():
+    processor = jobProcessor(
+        batch_size=5,
+        max_retries=2,
+        rate=float(os.getenv("MISTRAL_RPS", "1")),
+        burst=int(os.getenv("MISTRAL_BURST", "1"))
+    )
+    try:
+        await processor.ProcessAllJobs()
+    finally:
+        # Paylaşılan Mistral oturumu API ile ortak; kapanışı API'ye bırakılır
+        await processor.Cleanup(close_http_client=False)
+
+
+# LinkedIn testi her çalıştırmada, proxy çekme ise fetch aralığı dolduğunda yapılır
+proxy_manager = ProxyManager(fetch_interval_min=15, linkedin_interval_min=5)
+
+task_registry = taskRegistry(db, lock_ttl=float(os.getenv("SCHEDULER_LOCK_TTL", "300")))
+task_registry.Register("token_requester", RunTokenRequester,
+                       timeout=float(os.getenv("TOKEN_REQUESTER_TIMEOUT", "7200")))
+task_registry.Register("job_processor", RunJobProcessor,
+                       timeout=float(os.getenv("JOB_PROCESSOR_TIMEOUT", "14400")))
+task_registry.Register("proxy_monitor", proxy_manager.run_cycle,
+                       timeout=float(os.getenv("PROXY_MONITOR_TIMEOUT", "1800")))
+task_registry.Register("signup", lambda: RunModule("job_scrapers.signup"),
+                       timeout=float(os.getenv("SIGNUP_TIMEOUT", "1800")))
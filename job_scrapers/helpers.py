@@ -35,7 +35,7 @@ async def Stealthify( pg ) -> None:
 
 
 async def GetAndDeleteSLinkedinProxy( ) -> str | None:
-  pxs = await db.FindMany( "successlinkedin", {}, lim = 1 )  
+  pxs = await db.FindMany( "successlinkedin", {}, lim = 1, projection = { "proxy": 1 } )  
   if not pxs:  
     return None  
   px = pxs[0][ "proxy" ]  
@@ -15,21 +15,17 @@ from playwright.async_api import async_playwright, TimeoutError as PlaywrightTim
 from faker import Faker
 
 from .helpers import GetAndDeleteSLinkedinProxy, RandomInt, RandomPause, Retry, Stealthify
-from dbprocess.db_manager import dbManager
+from dbprocess.db_manager import db
 
 MAX_PROXY_ATTEMPTS = 50
 
-MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-MONGODB_DB = os.getenv("MONGODB_DB", "jobscrapper")
-dbmanager = dbManager(MONGODB_URI, MONGODB_DB)
-
 def SetLogging( ):
   logging.basicConfig( level = logging.INFO )
 
 
 async def CheckProxyAvail( ):
   try:
-    cnt = await dbmanager.GetColCount( "successlinkedin" )
+    cnt = await db.GetColCount( "successlinkedin" )
     return cnt > 0
   except Exception as e:
     logging.warning( f"Proxy kontrol hatası: {e}" )
@@ -275,11 +271,8 @@ async def Main( ) -> dict[str, str]:
       raise exc
     result = { "email": eml, "api_key": apikey }
     try:
-      MONGODB_URI = os.getenv( "MONGODB_URI", "mongodb://localhost:27017" )
-      MONGODB_DB = os.getenv( "MONGODB_DB", "jobscrapper" )
-      tdb = dbManager( MONGODB_URI, MONGODB_DB )
       doc = { "key": apikey, "token_limit": 200, "tokens_used": 0, "created_at": datetime.datetime.utcnow() }
-      await tdb.InsertOne( "jobscraper", doc )
+      await db.InsertOne( "jobscraper", doc )
       logger.info( "[db] API key başarıyla veritabanına kaydedildi." )
     except Exception as e:
       logger.error( f"[db error] API key veritabanına kaydedilemedi: {e}" )
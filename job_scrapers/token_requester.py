@@ -1,6 +1,5 @@
 import asyncio
 import logging
-import math
 import os
 import secrets
 import sys
@@ -11,13 +10,19 @@ from typing import Dict, List, Optional
 import aiohttp
 from pymongo import ReturnDocument
 from dbprocess.db_manager import db
+from nlp.performance_monitor import performance_monitor
+from nlp.utils import tokenBucket
 
+# discovered_at önde: yeni keşfedilen ilanlar sona eklenir, kaydedilen offset'ler kaymaz
 ORDER_BY = [
-  {"field": "date_posted",   "desc": False},
   {"field": "discovered_at", "desc": False},
+  {"field": "date_posted",   "desc": False},
   {"field": "job_title",     "desc": False},
 ]
 
+SCRAPER_STATE_ID = "token_requester:sweep"
+PAGE_SIZE = 200
+
 TURKEY_JOB_FILTER = {
   "location": {
     "country": ["Turkey", "Türkiye", "TR"]
@@ -36,11 +41,19 @@ class jobScraper:
     self.tokCol = os.getenv("TOKEN_COLLECTION", "jobscraper")
     self.rawCol = os.getenv("RAW_JOB_COLLECTION", "raw_jobs")
     self.apiBase = "https://api.theirstack.com/v1/jobs/search"
+    self.stateCol = os.getenv("PIPELINE_STATE_COLLECTION", "pipeline_state")
+    self.bulkChunk = int(os.getenv("RAW_JOB_BULK_CHUNK", "200"))
+    self.concurrency = max(1, int(os.getenv("SCRAPER_CONCURRENCY", "4")))
+    self.pageRetries = max(1, int(os.getenv("SCRAPER_PAGE_RETRIES", "3")))
+    self.rateLimiter = tokenBucket(float(os.getenv("THEIRSTACK_RPS", "2")), self.concurrency)
     self.SetupLogging()
     self.stTm = None
     self.totJ = 0
     self.totP = 0
     self.failP = 0
+    self.totExisting = 0
+    self.cursor = None
+    self.maxSeen = None
 
   def SetupLogging( self ):
     logging.basicConfig(
@@ -57,6 +70,29 @@ class jobScraper:
     self.lgr.info(f"Raw Job Collection: {self.rawCol}")
     self.lgr.info(f"API Base URL: {self.apiBase}")
 
+  def SearchFilters( self ) -> Dict:
+    flt = {
+      "posted_at_max_age_days": 1,
+      "job_country_code_or": ["TR"]
+    }
+    if self.cursor:
+      flt["discovered_at_gte"] = self.cursor
+    return flt
+
+  async def LoadCheckpoint( self ) -> Dict:
+    return await db.FindOne(self.stateCol, {"_id": SCRAPER_STATE_ID}) or {}
+
+  async def SaveCheckpoint( self, fields: Dict ):
+    await db.UpdateOne(
+      self.stateCol,
+      {"_id": SCRAPER_STATE_ID},
+      {"$set": {**fields, "updated_at": datetime.now(UTC)}},
+      upsert = True
+    )
+
+  def PageCursor( self, js: List[Dict] ) -> Optional[str]:
+    return max((j["discovered_at"] for j in js if j.get("discovered_at")), default = None)
+
   def GetDateFilter( self ) -> str:
     d48 = datetime.now(UTC) - timedelta(hours = 48)
     dStr = d48.strftime("%Y-%m-%d")
@@ -146,25 +182,27 @@ class jobScraper:
         await asyncio.sleep(wTm)
     raise Exception(f"All retry attempts failed for {reqType} request")
 
-  async def PickTokenWithQuota( self ) -> tuple[Optional[dict], int]:
+  async def ReserveTokenQuota( self, lim: int ) -> tuple[Optional[dict], int]:
+    # Kota tek atomik güncellemeyle ayrılır; paralel sayfalar aynı tokenın kotasını aşamaz
     flt = {"$expr": {"$lt": ["$tokens_used", "$token_limit"]}}
     srt = [("tokens_used", 1)]
-    d = await db.FindOne(self.tokCol, flt, srt)
+    upd = [{"$set": {"tokens_used": {"$min": ["$token_limit", {"$add": ["$tokens_used", lim]}]}}}]
+    d = await db.FindOneAndUpdate(self.tokCol, flt, upd, srt, projection = {"key": 1, "token_limit": 1, "tokens_used": 1})
     if not d:
       return None, 0
-    rem = d["token_limit"] - d.get("tokens_used", 0)
+    rem = min(lim, d["token_limit"] - d.get("tokens_used", 0))
     return d, rem
 
-  async def MarkTokenUsage( self, tId, usd ):
-    if(usd>0):
+  async def ReleaseTokenQuota( self, tId, unused: int ):
+    if(unused>0):
       await db.UpdateOne(
         self.tokCol,
         {"_id": tId},
-        {"$inc": {"tokens_used": usd}}
+        {"$inc": {"tokens_used": -unused}}
       )
 
   async def MarkTokenExhausted( self, tId ):
-    t = await db.FindOne(self.tokCol, {"_id": tId})
+    t = await db.FindOne(self.tokCol, {"_id": tId}, projection = {"token_limit": 1})
     if t:
       await db.UpdateOne(
         self.tokCol,
@@ -172,38 +210,37 @@ class jobScraper:
         {"$set": {"tokens_used": t["token_limit"]}}
       )
 
-  async def UpsertJobsAtomic( self, js: List[Dict] ):
+  async def UpsertJobsAtomic( self, js: List[Dict] ) -> tuple[int, int]:
     if not js:
       self.lgr.warning("No jobs to upsert")
-      return
+      return 0, 0
     self.lgr.info(f"Starting atomic upsert of {len(js)} jobs")
     upSt = time.time()
     try:
-      ups = 0
-      mod = 0
-      for j in js:
-        res = await db.UpdateOne(
-          self.rawCol,
-          {"_id": j["id"]},
-          {"$setOnInsert": j},
-          upsert = True
-        )
-        if hasattr(res, 'upserted_id') and res.upserted_id:
-          ups += 1
-        elif hasattr(res, 'modified_count') and res.modified_count:
-          mod += 1
+      ops = [ ({"_id": j["id"]}, {"$setOnInsert": j}) for j in js ]
+      stats = await db.BulkUpsert(self.rawCol, ops, chunk = self.bulkChunk)
+      ups = sum(st["upserted"] for st in stats)
+      mod = sum(st["matched"] for st in stats)
+      errs = sum(st["errors"] for st in stats)
+      if errs:
+        self.lgr.warning(f"Bulk upsert reported {errs} write errors")
+      performance_monitor.TrackPipelineItems("token_requester", "inserted", ups)
+      performance_monitor.TrackPipelineItems("token_requester", "existing", mod)
+      performance_monitor.TrackPipelineItems("token_requester", "write_error", errs)
       upTm = time.time() - upSt
       self.lgr.info(
         f"Upserted: {ups} yeni, {mod} mevcut, elapsed: {upTm:.2f}s"
       )
       self.totJ += len(js)
+      self.totExisting += mod
+      return ups, mod
     except Exception as e:
       self.lgr.error(f"Error upserting jobs: {e}")
       raise
 
-  async def ProcessPage( self, session: aiohttp.ClientSession, off: int, lim: int, dFil: str, pNum: int, tPgs: int ) -> bool:
-    self.lgr.info(f"=== Processing page {pNum + 1}/{tPgs} ===")
-    self.lgr.info(f"Offset: {off}, Limit: {lim}")
+  async def FetchPage( self, session: aiohttp.ClientSession, off: int, lim: int, pNum: int, tPgs: int ) -> Optional[List[Dict]]:
+    """Sayfayı çeker; yeniden denenebilir hatada None döner, kota kalmadıysa InsufficientCreditsError fırlatır."""
+    self.lgr.info(f"=== Fetching page {pNum + 1}/{tPgs} (offset: {off}, limit: {lim}) ===")
     pSt = time.time()
     pld = {
       "offset": off,
@@ -211,32 +248,28 @@ class jobScraper:
       "blur_company_data": False,
       "include_total_results": False,
       "order_by": ORDER_BY,
-      "posted_at_max_age_days": 1,
-      "job_country_code_or": ["TR"]
+      **self.SearchFilters()
     }
+    jobs: List[Dict] = []
     rLeft = 3
     while rLeft:
-      tDoc, rem = await self.PickTokenWithQuota()
+      tDoc, rem = await self.ReserveTokenQuota(lim - len(jobs))
       if not tDoc:
-        self.lgr.error("No token with remaining quota")
-        self.failP += 1
-        return False
-      effLim = min(lim, rem)
-      pld["limit"] = effLim
+        raise InsufficientCreditsError("No token with remaining quota")
+      # Tokenın kalan kotası sayfadan azsa sayfa birden çok tokenla parça parça çekilir
+      pld["offset"] = off + len(jobs)
+      pld["limit"] = rem
       try:
+        await self.rateLimiter.Acquire()
         resp = await self.MakeApiRequest(
           session, tDoc["key"], pld, reqType = f"page_{pNum + 1}"
         )
         js = resp.get("data", [])
-        await self.UpsertJobsAtomic(js)
-        await self.MarkTokenUsage(tDoc["_id"], len(js))
-        pTm = time.time() - pSt
-        self.lgr.info(
-          f"Page {pNum + 1} completed in {pTm:.2f}s: "
-          f"{len(js)} jobs processed"
-        )
-        self.totP += 1
-        return True
+        await self.ReleaseTokenQuota(tDoc["_id"], rem - len(js))
+        jobs.extend(js)
+        if len(jobs) >= lim or len(js) < rem:
+          self.lgr.info(f"Page {pNum + 1} fetched in {time.time() - pSt:.2f}s: {len(jobs)} jobs")
+          return jobs
       except InsufficientCreditsError:
         await self.MarkTokenExhausted(tDoc["_id"])
         rLeft -= 1
@@ -246,21 +279,113 @@ class jobScraper:
         rLeft -= 1
         self.lgr.warning("Invalid token, switching to next one...")
       except Exception as e:
-        pTm = time.time() - pSt
+        await self.ReleaseTokenQuota(tDoc["_id"], rem)
         self.lgr.error(
-          f"Error processing page {pNum + 1} after {pTm:.2f}s: {e}"
+          f"Error fetching page {pNum + 1} after {time.time() - pSt:.2f}s: {e}"
         )
-        self.failP += 1
-        return False
+        return None
     self.lgr.error("All tokens exhausted or invalid")
-    self.failP += 1
-    return False
+    return None
+
+  async def SweepPages( self, session: aiohttp.ClientSession, totJ: int, doneJ: int ) -> bool:
+    """
+    `concurrency` sayfa aynı anda çekilir, tek yazıcı görevi sırayla upsert eder.
+    Checkpoint yalnızca kesintisiz tamamlanan sayfa önekine kadar ilerler; tüm sayfalar yazıldıysa True döner.
+    """
+    pages = [(pNum, off, min(PAGE_SIZE, totJ - off)) for pNum, off in enumerate(range(0, totJ, PAGE_SIZE))]
+    pCnt = len(pages)
+    self.lgr.info(f"Calculated pagination: {pCnt} pages, {self.concurrency} in flight")
+    fetchQ: asyncio.Queue = asyncio.Queue()
+    for page in pages:
+      fetchQ.put_nowait((page, 0))
+    writeQ: asyncio.Queue = asyncio.Queue(maxsize = self.concurrency * 2)
+    written: Dict[int, tuple[int, Optional[str]]] = {}
+    state = {"open": pCnt, "prefix": 0, "prefixJobs": 0, "noQuota": False}
+    finished = asyncio.Event()
+
+    def PageDone( pNum: int, ok: bool ):
+      if not ok:
+        self.failP += 1
+        performance_monitor.TrackPipelineItems("token_requester_pages", "failed")
+      state["open"] -= 1
+      if state["open"] == 0:
+        finished.set()
+
+    async def Fetcher():
+      while True:
+        (pNum, off, lim), att = await fetchQ.get()
+        if state["noQuota"]:
+          PageDone(pNum, False)
+          continue
+        try:
+          js = await self.FetchPage(session, off, lim, pNum, pCnt)
+        except InsufficientCreditsError as e:
+          self.lgr.error(f"{e}, remaining pages are skipped")
+          state["noQuota"] = True
+          PageDone(pNum, False)
+          continue
+        if js is not None:
+          await writeQ.put((pNum, js))
+        elif att + 1 < self.pageRetries:
+          self.lgr.warning(f"Retrying page {pNum + 1} ({att + 2}/{self.pageRetries})")
+          await asyncio.sleep(2 ** att)
+          fetchQ.put_nowait(((pNum, off, lim), att + 1))
+        else:
+          self.lgr.error(f"Page {pNum + 1} failed after {self.pageRetries} attempts")
+          PageDone(pNum, False)
+
+    async def Writer():
+      while True:
+        pNum, js = await writeQ.get()
+        mod = None
+        # Yazma hatası sayfayı yeniden çekmeye (API kredisi) değmez; aynı işler yerinde tekrar yazılır
+        for att in range(self.pageRetries):
+          try:
+            _, mod = await self.UpsertJobsAtomic(js)
+            break
+          except Exception:
+            if att + 1 < self.pageRetries:
+              self.lgr.warning(f"Retrying write of page {pNum + 1} ({att + 2}/{self.pageRetries})")
+              await asyncio.sleep(2 ** att)
+        if mod is None:
+          self.lgr.error(f"Page {pNum + 1} could not be stored after {self.pageRetries} attempts")
+          PageDone(pNum, False)
+          continue
+        self.lgr.info(f"Page {pNum + 1} stored: {len(js)} jobs, {mod} already stored ({mod / max(1, len(js)):.0%})")
+        self.totP += 1
+        performance_monitor.TrackPipelineItems("token_requester_pages", "success")
+        written[pNum] = (len(js), self.PageCursor(js))
+        advanced = False
+        while state["prefix"] in written:
+          cnt, cur = written.pop(state["prefix"])
+          if cur and (self.maxSeen is None or cur > self.maxSeen):
+            self.maxSeen = cur
+          state["prefixJobs"] += cnt
+          state["prefix"] += 1
+          advanced = True
+        if advanced:
+          await self.SaveCheckpoint({"next_offset": doneJ + state["prefixJobs"], "max_discovered_at": self.maxSeen})
+        PageDone(pNum, True)
+
+    workers = [asyncio.create_task(Fetcher()) for _ in range(min(self.concurrency, pCnt))]
+    workers.append(asyncio.create_task(Writer()))
+    waiter = asyncio.create_task(finished.wait())
+    try:
+      done, _ = await asyncio.wait(workers + [waiter], return_when = asyncio.FIRST_COMPLETED)
+      for task in done:
+        if task is not waiter:
+          task.result()
+    finally:
+      for task in workers + [waiter]:
+        task.cancel()
+      await asyncio.gather(*workers, waiter, return_exceptions = True)
+    return state["prefix"] == pCnt
 
   async def TestConnection( self, session: aiohttp.ClientSession ) -> bool:
     self.lgr.info("=== Testing API Connection ===")
     try:
       self.lgr.info("Fetching available tokens for connection test")
-      allT = await db.FindMany(self.tokCol, {}, lim = 1)
+      allT = await db.FindMany(self.tokCol, {}, lim = 1, projection = {"key": 1})
       if not allT:
         self.lgr.error("No tokens available for connection test")
         return False
@@ -271,8 +396,7 @@ class jobScraper:
         "blur_company_data": True,
         "include_total_results": True,
         "order_by": ORDER_BY,
-        "posted_at_max_age_days": 1,
-        "job_country_code_or": ["TR"]
+        **self.SearchFilters()
       }
       resp = await self.MakeApiRequest(
         session, tDoc["key"], pld, reqType = "connection_test"
@@ -296,12 +420,11 @@ class jobScraper:
       "blur_company_data": True,
       "include_total_results": True,
       "order_by": ORDER_BY,
-      "posted_at_max_age_days": 1,
-      "job_country_code_or": ["TR"]
+      **self.SearchFilters()
     }
     try:
       self.lgr.info("Fetching available tokens for metadata request")
-      allT = await db.FindMany(self.tokCol, {}, lim = 1)
+      allT = await db.FindMany(self.tokCol, {}, lim = 1, projection = {"key": 1})
       if not allT:
         raise Exception("No tokens available for metadata request")
       tDoc = allT[0]
@@ -322,63 +445,88 @@ class jobScraper:
     now = datetime.now(UTC)
     one_month_ago = now - timedelta(days=30)
     flt = {"created_at": {"$lt": one_month_ago}}
-    old_tokens = await db.FindMany(self.tokCol, flt)
-    for t in old_tokens:
-      await db.UpdateOne(self.tokCol, {"_id": t["_id"]}, {"$set": {"tokens_used": 0, "created_at": now}})
-    if old_tokens:
-      self.lgr.info(f"{len(old_tokens)} eski token sıfırlandı.")
+    # Tek update_many: tokenlar okunmaz, koleksiyon boyutundan bağımsız
+    res = await db.UpdateMany(self.tokCol, flt, {"$set": {"tokens_used": 0, "created_at": now}})
+    if res is not None and res.modified_count:
+      self.lgr.info(f"{res.modified_count} eski token sıfırlandı.")
+
+  async def StartSweep( self ) -> int:
+    """Yarım kalan taramayı sürdürür, yoksa son cursor'dan yenisini başlatır; taramada tamamlanan iş sayısını döner."""
+    ckpt = await self.LoadCheckpoint()
+    if ckpt.get("status") == "running":
+      # Sayfalar discovered_at'e göre sıralı olduğundan tamamlanan kısım cursor ile atlanır;
+      # posted_at_max_age_days penceresi kaydıkça ham offset'ler kayabilir
+      self.cursor = ckpt.get("max_discovered_at") or ckpt.get("sweep_cursor")
+      self.maxSeen = self.cursor
+      self.lgr.info(
+        f"Resuming interrupted sweep after {ckpt.get('next_offset', 0)} jobs (cursor: {self.cursor})"
+      )
+      return ckpt.get("next_offset", 0)
+    self.cursor = ckpt.get("cursor")
+    self.maxSeen = self.cursor
+    self.lgr.info(f"Starting new sweep (cursor: {self.cursor or 'none, last day'})")
+    await self.SaveCheckpoint({
+      "status": "running",
+      "sweep_cursor": self.cursor,
+      "next_offset": 0,
+      "max_discovered_at": self.maxSeen,
+      "started_at": datetime.now(UTC)
+    })
+    return 0
+
+  async def FinishSweep( self ):
+    # Sonraki tarama bu noktadan itibaren keşfedilen ilanları ister (sınırdaki ilanlar tekrar upsert edilir)
+    await self.SaveCheckpoint({
+      "status": "done",
+      "cursor": self.maxSeen,
+      "finished_at": datetime.now(UTC)
+    })
+    self.lgr.info(f"Sweep completed, cursor advanced to {self.maxSeen}")
 
   async def RunScraper( self ):
-    self.stTm = time.time()
-    self.lgr.info("=== Starting Job Scraper ===")
-    try:
-      await self.ResetOldTokens()
-      async with aiohttp.ClientSession() as sess:
-        self.lgr.info("Created aiohttp session")
-        connOk = await self.TestConnection(sess)
-        if not connOk:
-          self.lgr.error("Connection test failed, aborting")
-          return
-        totJ = await self.GetTotalJobsCount(sess)
-        if totJ == 0:
-          self.lgr.info("No jobs found in the specified date range")
-          return
-        remJ = totJ
-        pNum = 0
-        pCnt = math.ceil(totJ / 200)
-        self.lgr.info(f"Calculated pagination: {pCnt} pages")
-        dFil = self.GetDateFilter()
-        self.lgr.info("=== Starting page processing ===")
-        while remJ > 0:
-          off = totJ - remJ
-          lim = min(200, remJ)
-          self.lgr.info(
-            f"Processing page {pNum + 1}/{pCnt} "
-            f"(offset: {off}, limit: {lim})"
-          )
-          ok = await self.ProcessPage(
-            sess, off, lim, dFil, pNum, pCnt
-          )
-          if not ok:
-            break
-          remJ -= lim
-          pNum += 1
+    with performance_monitor.PipelineRun("token_requester"):
+      self.stTm = time.time()
+      self.lgr.info("=== Starting Job Scraper ===")
+      try:
+        await db.EnsureIndexes()
+        await self.ResetOldTokens()
+        doneJ = await self.StartSweep()
+        async with aiohttp.ClientSession() as sess:
+          self.lgr.info("Created aiohttp session")
+          connOk = await self.TestConnection(sess)
+          if not connOk:
+            self.lgr.error("Connection test failed, aborting")
+            return
+          totJ = await self.GetTotalJobsCount(sess)
+          if totJ == 0:
+            self.lgr.info("No new jobs since the last checkpoint")
+            await self.FinishSweep()
+            return
+          self.lgr.info("=== Starting page processing ===")
+          if await self.SweepPages(sess, totJ, doneJ):
+            await self.FinishSweep()
+          else:
+            self.lgr.warning("Sweep incomplete, next run resumes from the checkpoint")
+          totTm = time.time() - self.stTm
+          self.lgr.info("=== Job Scraper Completed ===")
+          self.lgr.info(f"Total execution time: {totTm:.2f}s")
+          self.lgr.info(f"Total pages processed: {self.totP}")
+          self.lgr.info(f"Total jobs processed: {self.totJ}")
+          self.lgr.info(f"Failed pages: {self.failP}")
+          self.lgr.info(f"Already stored: {self.totExisting}/{self.totJ} ({self.totExisting / max(1, self.totJ):.0%})")
+          self.lgr.info(f"Average time per page: {totTm/max(1, self.totP):.2f}s")
+      except Exception as e:
         totTm = time.time() - self.stTm
-        self.lgr.info("=== Job Scraper Completed ===")
-        self.lgr.info(f"Total execution time: {totTm:.2f}s")
-        self.lgr.info(f"Total pages processed: {self.totP}")
-        self.lgr.info(f"Total jobs processed: {self.totJ}")
-        self.lgr.info(f"Failed pages: {self.failP}")
-        self.lgr.info(f"Average time per page: {totTm/max(1, self.totP):.2f}s")
-    except Exception as e:
-      totTm = time.time() - self.stTm
-      self.lgr.error(f"Fatal error in scraper after {totTm:.2f}s: {e}")
-      sys.exit(1)
+        self.lgr.error(f"Fatal error in scraper after {totTm:.2f}s: {e}")
+        raise
 
 
 async def Main():
   scr = jobScraper()
-  await scr.RunScraper()
+  try:
+    await scr.RunScraper()
+  except Exception:
+    sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,209 @@
+import logging
+import re
+import sys
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from dbprocess.db_manager import dbError, dbManager
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_COLLECTION = "job_analysis_results"
+# v1: ham LLM JSON'u (null/boş alanlar dahil) + source_url; v2: jobAnalysis.ToDoc() çıktısı
+ANALYSIS_SCHEMA_VERSION = 2
+PROCESSOR_VERSION = "2.0"
+
+# CV üretiminin kullandığı alanlar; slim okuma yalnızca bunları çeker
+CV_PROMPT_FIELDS = ( "job_title", "summary", "keywords", "responsibilities", "requirements", "benefits" )
+CV_PROMPT_PROJECTION = { "schema_version": 1, **{ f"analysis_result.{name}": 1 for name in CV_PROMPT_FIELDS } }
+
+def NormalizeTerms( values: Any ) -> List[str]:
+  """Beceri/anahtar kelime listesini temizler: boşluk sadeleştirme, büyük/küçük harfe duyarsız tekilleştirme, intern."""
+  if isinstance( values, str ):
+    values = values.split( "," )
+  if not isinstance( values, list ):
+    return []
+  seen = set()
+  terms = []
+  for value in values:
+    if not isinstance( value, str ):
+      continue
+    term = re.sub( r"\s+", " ", value ).strip()
+    if not term or term.casefold() in seen:
+      continue
+    seen.add( term.casefold() )
+    terms.append( sys.intern( term ) )
+  return terms
+
+def CleanTexts( values: Any ) -> List[str]:
+  # Sorumluluk/yan hak gibi cümle listeleri: yalnızca boşlar atılır, sıra ve tekrarlar korunur
+  if isinstance( values, str ):
+    values = [ values ]
+  if not isinstance( values, list ):
+    return []
+  return [ v.strip() for v in values if isinstance( v, str ) and v.strip() ]
+
+def CleanText( value: Any ) -> Optional[str]:
+  if value is None:
+    return None
+  value = str( value ).strip()
+  return value or None
+
+def CleanNumber( value: Any ) -> Optional[float]:
+  if isinstance( value, bool ) or value is None:
+    return None
+  if isinstance( value, ( int, float ) ):
+    return value
+  match = re.search( r"\d+(?:\.\d+)?", str( value ) )
+  if not match:
+    return None
+  number = float( match.group() )
+  return int( number ) if number.is_integer() else number
+
+def _Compact( obj ) -> Dict[str, Any]:
+  # None ve boş listeler/sözlükler saklanmaz; okurken varsayılanlara döner
+  doc = {}
+  for f in fields( obj ):
+    value = getattr( obj, f.name )
+    if hasattr( value, "__dataclass_fields__" ):
+      value = _Compact( value )
+    if value is None or value == [] or value == {}:
+      continue
+    doc[ f.name ] = value
+  return doc
+
+@dataclass( slots = True )
+class analysisRequirements:
+  education: List[str] = field( default_factory = list )
+  experience_years_min: Optional[float] = None
+  experience_years_pref: Optional[float] = None
+  skills_mandatory: List[str] = field( default_factory = list )
+  skills_optional: List[str] = field( default_factory = list )
+  certifications: List[str] = field( default_factory = list )
+  languages: List[str] = field( default_factory = list )
+  other_requirements: List[str] = field( default_factory = list )
+
+  @classmethod
+  def FromDict( cls, data: Any ) -> "analysisRequirements":
+    data = data if isinstance( data, dict ) else {}
+    mandatory = NormalizeTerms( data.get( "skills_mandatory" ) )
+    # Zorunlu listede olan beceri opsiyonelde tekrar saklanmaz
+    taken = { s.casefold() for s in mandatory }
+    return cls(
+      education = CleanTexts( data.get( "education" ) ),
+      experience_years_min = CleanNumber( data.get( "experience_years_min" ) ),
+      experience_years_pref = CleanNumber( data.get( "experience_years_pref" ) ),
+      skills_mandatory = mandatory,
+      skills_optional = [ s for s in NormalizeTerms( data.get( "skills_optional" ) ) if s.casefold() not in taken ],
+      certifications = NormalizeTerms( data.get( "certifications" ) ),
+      languages = NormalizeTerms( data.get( "languages" ) ),
+      other_requirements = CleanTexts( data.get( "other_requirements" ) )
+    )
+
+@dataclass( slots = True )
+class analysisApplication:
+  apply_url: Optional[str] = None
+  contact_email: Optional[str] = None
+  deadline: Optional[str] = None
+
+  @classmethod
+  def FromDict( cls, data: Any ) -> "analysisApplication":
+    data = data if isinstance( data, dict ) else {}
+    return cls(
+      apply_url = CleanText( data.get( "apply_url" ) ),
+      contact_email = CleanText( data.get( "contact_email" ) ),
+      deadline = CleanText( data.get( "deadline" ) )
+    )
+
+@dataclass( slots = True )
+class jobAnalysis:
+  """job_analysis_results.analysis_result'ın tipli hali; eksik alanlar EXTRACTION_SYSTEM_PROMPT şemasındaki varsayılanlardır."""
+  job_title: str = ""
+  company_name: Optional[str] = None
+  department: Optional[str] = None
+  employment_type: Optional[str] = None
+  location: Optional[str] = None
+  summary: Optional[str] = None
+  keywords: List[str] = field( default_factory = list )
+  responsibilities: List[str] = field( default_factory = list )
+  requirements: analysisRequirements = field( default_factory = analysisRequirements )
+  benefits: List[str] = field( default_factory = list )
+  application: analysisApplication = field( default_factory = analysisApplication )
+  source_url: Optional[str] = None
+
+  @classmethod
+  def FromDict( cls, data: Any ) -> "jobAnalysis":
+    """Ham LLM çıktısını ya da herhangi bir şema sürümündeki kaydı normalize ederek okur."""
+    data = data if isinstance( data, dict ) else {}
+    return cls(
+      job_title = CleanText( data.get( "job_title" ) ) or "",
+      company_name = CleanText( data.get( "company_name" ) ),
+      department = CleanText( data.get( "department" ) ),
+      employment_type = CleanText( data.get( "employment_type" ) ),
+      location = CleanText( data.get( "location" ) ),
+      summary = CleanText( data.get( "summary" ) ),
+      keywords = NormalizeTerms( data.get( "keywords" ) ),
+      responsibilities = CleanTexts( data.get( "responsibilities" ) ),
+      requirements = analysisRequirements.FromDict( data.get( "requirements" ) ),
+      benefits = CleanTexts( data.get( "benefits" ) ),
+      application = analysisApplication.FromDict( data.get( "application" ) ),
+      source_url = CleanText( data.get( "source_url" ) )
+    )
+
+  def ToDoc( self ) -> Dict[str, Any]:
+    return _Compact( self )
+
+  def PromptFields( self ) -> Dict[str, Any]:
+    return {
+      "job_title": self.job_title,
+      "summary": self.summary or "",
+      "keywords": self.keywords,
+      "responsibilities": self.responsibilities,
+      "requirements": _Compact( self.requirements ),
+      "benefits": self.benefits
+    }
+
+def BuildAnalysisDoc( job_id, analysis: jobAnalysis, duplicate_of = None ) -> Dict[str, Any]:
+  doc = {
+    "job_id": job_id,
+    "analysis_result": analysis.ToDoc(),
+    "schema_version": ANALYSIS_SCHEMA_VERSION,
+    "processed_at": datetime.now(),
+    "processor_version": PROCESSOR_VERSION
+  }
+  if duplicate_of is not None:
+    doc[ "duplicate_of" ] = duplicate_of
+  return doc
+
+async def MigrateAnalysisDoc( db: dbManager, doc: Dict[str, Any] ) -> jobAnalysis:
+  """Eski sürümdeki tam kaydı v2'ye çevirip yerinde günceller; yazma hatası okumayı bozmaz."""
+  analysis = jobAnalysis.FromDict( doc.get( "analysis_result" ) )
+  try:
+    await db.UpdateOne(
+      ANALYSIS_COLLECTION,
+      { "_id": doc[ "_id" ], "schema_version": doc.get( "schema_version" ) },
+      { "$set": { "analysis_result": analysis.ToDoc(), "schema_version": ANALYSIS_SCHEMA_VERSION } }
+    )
+    logger.info( f"Analiz kaydı v{ANALYSIS_SCHEMA_VERSION} şemasına taşındı: job {doc.get( 'job_id' )}" )
+  except dbError as exc:
+    logger.warning( f"Analiz kaydı taşınamadı (job {doc.get( 'job_id' )}): {exc}" )
+  return analysis
+
+async def LoadAnalysis( db: dbManager, job_id, projection: Optional[Dict[str, Any]] = None ) -> Optional[jobAnalysis]:
+  """
+  Analizi okur; `projection` verilirse yalnızca o alanlar çekilir (ör. CV_PROMPT_PROJECTION).
+  Eski şemadaki kayıt ilk okunuşta tam haliyle çekilip v2'ye taşınır.
+  """
+  if projection is not None:
+    projection = { **projection, "schema_version": 1 }
+  doc = await db.FindOne( ANALYSIS_COLLECTION, { "job_id": job_id }, projection = projection )
+  if not doc or "analysis_result" not in doc:
+    return None
+  if doc.get( "schema_version", 1 ) >= ANALYSIS_SCHEMA_VERSION:
+    return jobAnalysis.FromDict( doc[ "analysis_result" ] )
+  if projection is not None:
+    doc = await db.FindOne( ANALYSIS_COLLECTION, { "_id": doc[ "_id" ] } )
+    if not doc or "analysis_result" not in doc:
+      return None
+  return await MigrateAnalysisDoc( db, doc )
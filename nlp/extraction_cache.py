@@ -0,0 +1,115 @@
+import copy
+import hashlib
+import logging
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from dbprocess.db_manager import dbManager
+from .nlpApi import EXTRACTION_MODEL, EXTRACTION_SCHEMA_VERSION, EXTRACTION_SYSTEM_PROMPT
+from .performance_monitor import performance_monitor
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_CACHE_COLLECTION = "extraction_cache"
+
+def PromptVersion() -> str:
+  prompt_hash = hashlib.sha1(EXTRACTION_SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:10]
+  return f"{EXTRACTION_SCHEMA_VERSION}:{EXTRACTION_MODEL}:{prompt_hash}"
+
+def NormalizeJobText(job_text: str) -> str:
+  text = unicodedata.normalize("NFKC", job_text or "")
+  return re.sub(r"\s+", " ", text).strip().lower()
+
+def ExtractionCacheKey(job_text: str, version: Optional[str] = None) -> str:
+  raw = f"{version or PromptVersion()}\n{NormalizeJobText(job_text)}"
+  return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class lruCacheBackend:
+  name = "lru"
+
+  def __init__(self, max_size: int = 2048):
+    self.max_size = max_size
+    self.items: "OrderedDict[str, Dict]" = OrderedDict()
+
+  async def Get(self, key: str) -> Optional[Dict]:
+    if key not in self.items:
+      return None
+    self.items.move_to_end(key)
+    return self.items[key]
+
+  async def Set(self, key: str, value: Dict):
+    self.items[key] = value
+    self.items.move_to_end(key)
+    while len(self.items) > self.max_size:
+      self.items.popitem(last = False)
+
+class mongoCacheBackend:
+  """Süresi `created_at` üzerindeki TTL indeksi ile dolan Mongo önbelleği (bkz. INDEXES)."""
+  name = "mongo"
+
+  def __init__(self, db: dbManager, col: str = EXTRACTION_CACHE_COLLECTION, version_fn: Callable[[], str] = None):
+    self.db = db
+    self.col = col
+    self.version_fn = version_fn or PromptVersion
+
+  async def Get(self, key: str) -> Optional[Dict]:
+    doc = await self.db.FindOne(self.col, {"_id": key}, projection = {"result": 1})
+    return doc.get("result") if doc else None
+
+  async def Set(self, key: str, value: Dict):
+    await self.db.UpdateOne(
+      self.col,
+      {"_id": key},
+      {"$set": {"result": value, "version": self.version_fn(), "created_at": datetime.now()}},
+      upsert = True
+    )
+
+class extractionCache:
+  """Katmanlı önbellek: ilk bulunan katman döner, üst katmanlar doldurulur."""
+  def __init__(self, backends: List):
+    self.backends = backends
+    self.hits = 0
+    self.misses = 0
+
+  async def Get(self, job_text: str) -> Optional[Dict]:
+    key = ExtractionCacheKey(job_text)
+    for idx, backend in enumerate(self.backends):
+      try:
+        value = await backend.Get(key)
+      except Exception as exc:
+        logger.warning(f"Önbellek okuma hatası ({backend.name}): {exc}")
+        value = None
+      if value is not None:
+        performance_monitor.TrackCacheRequest(backend.name, True)
+        for upper in self.backends[:idx]:
+          await upper.Set(key, copy.deepcopy(value))
+        self.hits += 1
+        return copy.deepcopy(value)
+      performance_monitor.TrackCacheRequest(backend.name, False)
+    self.misses += 1
+    return None
+
+  async def Set(self, job_text: str, value: Dict):
+    key = ExtractionCacheKey(job_text)
+    for backend in self.backends:
+      try:
+        await backend.Set(key, copy.deepcopy(value))
+      except Exception as exc:
+        logger.warning(f"Önbellek yazma hatası ({backend.name}): {exc}")
+
+def BuildExtractionCache(db: dbManager, spec: Optional[str] = None) -> Optional[extractionCache]:
+  """`spec` virgülle ayrılmış katman listesidir (ör. "lru,mongo"); boşsa önbellek kapalıdır."""
+  spec = spec if spec is not None else os.getenv("EXTRACTION_CACHE_BACKENDS", "lru,mongo")
+  backends = []
+  for name in [n.strip() for n in spec.split(",") if n.strip()]:
+    if name == "lru":
+      backends.append(lruCacheBackend(int(os.getenv("EXTRACTION_CACHE_LRU_SIZE", "2048"))))
+    elif name == "mongo":
+      backends.append(mongoCacheBackend(db))
+    else:
+      logger.warning(f"Bilinmeyen önbellek katmanı: {name}")
+  return extractionCache(backends) if backends else None
@@ -0,0 +1,89 @@
+import hashlib
+import logging
+import re
+import unicodedata
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from dbprocess.db_manager import dbManager
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_COLLECTION = "job_fingerprints"
+SIMHASH_BITS = 64
+
+def Shingles(text: str, size: int = 3) -> List[str]:
+  text = unicodedata.normalize("NFKC", text or "").lower()
+  words = re.findall(r"\w+", text)
+  if len(words) < size:
+    return words
+  return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+def SimHash(shingles: List[str]) -> int:
+  weights = [0] * SIMHASH_BITS
+  for sh in shingles:
+    h = int.from_bytes(hashlib.blake2b(sh.encode("utf-8"), digest_size = 8).digest(), "big")
+    for bit in range(SIMHASH_BITS):
+      weights[bit] += 1 if (h >> bit) & 1 else -1
+  value = 0
+  for bit in range(SIMHASH_BITS):
+    if weights[bit] > 0:
+      value |= 1 << bit
+  return value
+
+def HammingDistance(a: int, b: int) -> int:
+  return bin(a ^ b).count("1")
+
+def BandKeys(value: int, bands: int) -> List[str]:
+  # Güvercin yuvası: mesafe < bands ise en az bir bant birebir eşleşir
+  width = SIMHASH_BITS // bands
+  keys = []
+  for i in range(bands):
+    lo = i * width
+    hi = SIMHASH_BITS if i == bands - 1 else lo + width
+    part = (value >> lo) & ((1 << (hi - lo)) - 1)
+    keys.append(f"{i}:{part:x}")
+  return keys
+
+class fingerprintIndex:
+  """SimHash parmak izlerini bant anahtarlarıyla Mongo'da saklar ve yakın kopya arar."""
+  def __init__(self, db: dbManager, max_distance: int = 3, min_shingles: int = 20, col: str = FINGERPRINT_COLLECTION):
+    self.db = db
+    self.max_distance = max_distance
+    self.bands = max_distance + 1
+    self.min_shingles = min_shingles
+    self.col = col
+
+  def Compute(self, text: str) -> Optional[int]:
+    shingles = Shingles(text)
+    if len(shingles) < self.min_shingles:
+      return None
+    return SimHash(shingles)
+
+  async def FindNearest(self, value: int, exclude = None) -> Optional[Tuple[object, int]]:
+    candidates = await self.db.FindMany(
+      self.col,
+      {"bands": {"$in": BandKeys(value, self.bands)}},
+      200,
+      projection = {"simhash": 1}
+    )
+    best = None
+    for doc in candidates:
+      if exclude is not None and doc["_id"] == exclude:
+        continue
+      dist = HammingDistance(value, int(doc["simhash"], 16))
+      if dist <= self.max_distance and (best is None or dist < best[1]):
+        best = (doc["_id"], dist)
+    return best
+
+  async def Add(self, job_id, value: int):
+    await self.db.UpdateOne(
+      self.col,
+      {"_id": job_id},
+      {"$set": {
+        "simhash": f"{value:016x}",
+        "bands": BandKeys(value, self.bands),
+        "created_at": datetime.now()
+      }},
+      upsert = True
+    )
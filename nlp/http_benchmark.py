@@ -0,0 +1,121 @@
+"""
+http_benchmark.py
+Paylaşımlı Mistral oturumunun (mistralHttpClient) istek başına kazandırdığı gecikmeyi
+yerel sahte bir HTTPS sunucusuna karşı ölçer: her istekte yeni ClientSession açan eski
+yol ile bağlantıları yeniden kullanan paylaşımlı oturum karşılaştırılır.
+Sertifika verilmezse `openssl` ile geçici, kendinden imzalı bir sertifika üretilir.
+"""
+import argparse
+import asyncio
+import os
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from .nlpApi import mistralHttpClient
+
+FAKE_COMPLETION = {"choices": [{"message": {"role": "assistant", "content": "{}"}}]}
+
+def SelfSignedCert(workdir: str) -> Tuple[str, str]:
+  cert = os.path.join(workdir, "cert.pem")
+  key = os.path.join(workdir, "key.pem")
+  subprocess.run(
+    ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+     "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+    check = True,
+    capture_output = True
+  )
+  return cert, key
+
+async def StartFakeServer(host: str, port: int, cert: str, key: str, delay: float) -> web.AppRunner:
+  async def completions(request: web.Request) -> web.Response:
+    await request.read()
+    if delay:
+      await asyncio.sleep(delay)
+    return web.json_response(FAKE_COMPLETION)
+
+  app = web.Application()
+  app.router.add_post("/v1/chat/completions", completions)
+  runner = web.AppRunner(app, access_log = None)
+  await runner.setup()
+  ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+  ctx.load_cert_chain(cert, key)
+  await web.TCPSite(runner, host, port, ssl_context = ctx).start()
+  return runner
+
+async def FreshSessionRequests(url: str, n: int) -> List[float]:
+  # Eski yol: her istekte yeni oturum, dolayısıyla yeni TCP bağlantısı ve TLS el sıkışması
+  latencies = []
+  for _ in range(n):
+    st = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+      async with session.post(url, json = {"messages": []}, ssl = False) as resp:
+        await resp.read()
+    latencies.append(time.perf_counter() - st)
+  return latencies
+
+async def SharedSessionRequests(url: str, n: int) -> List[float]:
+  client = mistralHttpClient()
+  latencies = []
+  try:
+    for _ in range(n):
+      st = time.perf_counter()
+      session = await client.GetSession()
+      async with session.post(url, json = {"messages": []}, ssl = False) as resp:
+        await resp.read()
+      latencies.append(time.perf_counter() - st)
+  finally:
+    await client.Close()
+  return latencies
+
+async def RunBenchmark(n: int, port: int, delay: float, cert: str, key: str) -> Tuple[List[float], List[float]]:
+  runner = await StartFakeServer("127.0.0.1", port, cert, key, delay)
+  url = f"https://127.0.0.1:{port}/v1/chat/completions"
+  try:
+    # Isınma: sunucu ve istemci tarafı ilk çağrı maliyetleri ölçüme karışmasın
+    await FreshSessionRequests(url, 2)
+    fresh = await FreshSessionRequests(url, n)
+    shared = await SharedSessionRequests(url, n)
+  finally:
+    await runner.cleanup()
+  return fresh, shared
+
+def Describe(name: str, latencies: List[float]) -> str:
+  ms = sorted(lat * 1000 for lat in latencies)
+  p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+  return f"{name}: ortalama {statistics.mean(ms):.2f}ms  p50 {statistics.median(ms):.2f}ms  p95 {p95:.2f}ms"
+
+def Main():
+  parser = argparse.ArgumentParser(description = "Paylaşımlı Mistral HTTP oturumu için gecikme ölçümü (sahte HTTPS sunucusu)")
+  parser.add_argument("-n", "--requests", type = int, default = 200)
+  parser.add_argument("--port", type = int, default = 8443)
+  parser.add_argument("--delay", type = float, default = 0.0, help = "Sahte sunucunun yanıt başına bekleme süresi (s)")
+  parser.add_argument("--cert", help = "PEM sertifika (verilmezse openssl ile üretilir)")
+  parser.add_argument("--key", help = "PEM özel anahtar")
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as workdir:
+    cert, key = args.cert, args.key
+    if not (cert and key):
+      try:
+        cert, key = SelfSignedCert(workdir)
+      except (OSError, subprocess.CalledProcessError) as exc:
+        print(f"Sertifika üretilemedi ({exc}); --cert ve --key verin.")
+        sys.exit(2)
+    fresh, shared = asyncio.run(RunBenchmark(args.requests, args.port, args.delay, cert, key))
+
+  print(f"İstek: {args.requests}  (sunucu gecikmesi {args.delay * 1000:.0f}ms)")
+  print(Describe("Her istekte yeni oturum", fresh))
+  print(Describe("Paylaşımlı oturum      ", shared))
+  saved = (statistics.mean(fresh) - statistics.mean(shared)) * 1000
+  print(f"İstek başına kazanç: {saved:.2f}ms")
+
+if __name__ == "__main__":
+  Main()
@@ -2,13 +2,22 @@ import asyncio
 import json
 import logging
 import os
+import secrets
+import socket
 import sys
+import time
 from typing import Dict, List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from pymongo.errors import OperationFailure
 
-from .nlpApi import ExtractJobData
+from .nlpApi import ExtractJobData, CloseMistralClient
 from .job_analyzer import jobAnalyzer
+from .utils import tokenBucket
+from .extraction_cache import BuildExtractionCache
+from .fingerprint import fingerprintIndex
+from .analysis_model import ANALYSIS_COLLECTION, BuildAnalysisDoc, jobAnalysis
+from .performance_monitor import performance_monitor
 from dbprocess.db_manager import db
 
 import asyncio
@@ -28,14 +37,40 @@ MONGODB_DB = os.getenv("MONGODB_DB", "jobscrapper")
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+PIPELINE_STATE_COLLECTION = "pipeline_state"
+# Standalone mongod change stream desteklemez; resume token oplog'dan düşmüşse akış yeniden başlatılır
+CHANGE_STREAM_UNSUPPORTED = {40573}
+CHANGE_STREAM_HISTORY_LOST = {260, 280, 286}
+# Analizde kullanılan raw_jobs alanları (CombineJobText, SaveAnalysisResult, claim log'u); şirket blob'ları taşınmaz
+RAW_JOB_PROJECTION = {
+  "description": 1,
+  "location": 1,
+  "long_location": 1,
+  "source_url": 1,
+  "url": 1,
+  "lease_owner": 1
+}
+
 class jobProcessor:
-  def __init__( self, batch_size: int = 10, max_retries: int = 3 ):
+  def __init__( self, batch_size: int = 10, max_retries: int = 3, concurrency: int = 1, rate: float = 1.0, burst: int = 1 ):
     self.batch_size = batch_size
     self.max_retries = max_retries
+    self.concurrency = max(1, concurrency)
+    self.rate_limiter = tokenBucket(rate, burst)
+    self.playwright_lock = asyncio.Lock()
+    self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(3)}"
+    self.lease_seconds = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+    self.retry_delay_seconds = int(os.getenv("JOB_RETRY_DELAY_SECONDS", "60"))
+    self.held_jobs = set()
+    self.extraction_cache = BuildExtractionCache(db)
+    self.fingerprint_index = None
+    if os.getenv("NEAR_DUP_ENABLED", "true").lower() == "true":
+      self.fingerprint_index = fingerprintIndex(db, max_distance = int(os.getenv("NEAR_DUP_MAX_DISTANCE", "3")))
     self.processed_count = 0
     self.success_count = 0
     self.error_count = 0
     self.skipped_count = 0
+    self.duplicate_count = 0
     self.job_analyzer = None
     load_dotenv()
 
@@ -50,24 +85,34 @@ class jobProcessor:
       return False
 
   async def IsJobAlreadyAnalyzed( self, job_id ) -> bool:
-    try:
-      existing = await db.FindOne(
-        "job_analysis_results",
-        {"job_id": job_id}
+    # Hata "analiz edilmemiş" sayılmaz; ProcessSingleJob işi hata sayıp bırakır, LLM'e tekrar ödeme yapılmaz
+    return await db.Exists(ANALYSIS_COLLECTION, {"job_id": job_id})
+
+  async def GetAnalyzedJobIds( self, job_ids: List ) -> set:
+    if not job_ids:
+      return set()
+    return {
+      d.get("job_id")
+      async for d in db.Stream(
+        ANALYSIS_COLLECTION,
+        {"job_id": {"$in": list(job_ids)}},
+        {"job_id": 1, "_id": 0},
+        batch_size = len(job_ids)
       )
-      return existing is not None
-    except Exception as e:
-      logger.error(f"❌ Çift kontrol hatası (job {job_id}): {e}")
-      return False
+    }
+
+  def CombineLocation( self, job_data: Dict ) -> str:
+    location = job_data.get('location', '')
+    long_location = job_data.get('long_location', '')
+    combined_location = location
+    if( long_location and long_location != location ):
+      combined_location = f"{location} - {long_location}" if location else long_location
+    return combined_location
 
   def CombineJobText( self, job_data: Dict ) -> str:
     try:
       description = job_data.get('description', '')
-      location = job_data.get('location', '')
-      long_location = job_data.get('long_location', '')
-      combined_location = location
-      if( long_location and long_location != location ):
-        combined_location = f"{location} - {long_location}" if location else long_location
+      combined_location = self.CombineLocation(job_data)
       combined_text = description
       if ( combined_location ):
         combined_text = f"Location: {combined_location}\n\n{description}"
@@ -78,12 +123,20 @@ class jobProcessor:
       return job_data.get('description', '')
 
   async def ProcessJobWithNlpApi( self, job_text: str, job_id: str ) -> Optional[Dict]:
+    if self.extraction_cache:
+      cached = await self.extraction_cache.Get(job_text)
+      if cached:
+        logger.info(f"💾 Job {job_id} için önbellekteki analiz kullanıldı")
+        return cached
     for att in range(self.max_retries):
       try:
         logger.info(f"Job {job_id} NLP API ile işleniyor (deneme {att + 1}/{self.max_retries})")
+        await self.rate_limiter.Acquire()
         result = await ExtractJobData(job_text)
         if result and isinstance(result, dict):
           logger.info(f"✅ Job {job_id} NLP API ile başarıyla işlendi")
+          if self.extraction_cache:
+            await self.extraction_cache.Set(job_text, result)
           return result
         else:
           logger.warning(f"⚠️ NLP API job {job_id} için geçersiz sonuç döndürdü")
@@ -94,82 +147,203 @@ class jobProcessor:
     return None
 
   async def ProcessJobWithPlaywright( self, job_text: str, job_id: str ) -> Optional[Dict]:
-    try:
-      if not self.job_analyzer:
-        if not await self.InitializeJobAnalyzer():
+    # Tek tarayıcı oturumu paylaşıldığı için fallback çağrıları sıraya alınır
+    async with self.playwright_lock:
+      try:
+        if not self.job_analyzer:
+          if not await self.InitializeJobAnalyzer():
+            return None
+        logger.info(f"Job {job_id} Playwright sistemi ile işleniyor")
+        result = await self.job_analyzer.analyze_job_description(job_text)
+        if result and not result.get('error'):
+          logger.info(f"✅ Job {job_id} Playwright ile başarıyla işlendi")
+          return result
+        else:
+          logger.warning(f"⚠️ Playwright job {job_id} için hata döndürdü: {result.get('error', 'Bilinmeyen hata')}")
           return None
-      logger.info(f"Job {job_id} Playwright sistemi ile işleniyor")
-      result = await self.job_analyzer.analyze_job_description(job_text)
-      if result and not result.get('error'):
-        logger.info(f"✅ Job {job_id} Playwright ile başarıyla işlendi")
-        return result
-      else:
-        logger.warning(f"⚠️ Playwright job {job_id} için hata döndürdü: {result.get('error', 'Bilinmeyen hata')}")
+      except Exception as e:
+        logger.error(f"❌ Playwright hatası job {job_id}: {e}")
         return None
-    except Exception as e:
-      logger.error(f"❌ Playwright hatası job {job_id}: {e}")
-      return None
 
-  async def SaveAnalysisResult( self, job_id: str, analysis_result: Dict, original_job: Dict ):
+  async def CloneNearDuplicateAnalysis( self, job_id, job_data: Dict, fingerprint: int ) -> bool:
+    match = await self.fingerprint_index.FindNearest(fingerprint, exclude = job_id)
+    if not match:
+      return False
+    dup_of, distance = match
+    source = await db.FindOne(ANALYSIS_COLLECTION, {"job_id": dup_of}, projection = {"analysis_result": 1})
+    if not source or "analysis_result" not in source:
+      return False
+    analysis = jobAnalysis.FromDict(source["analysis_result"])
+    analysis.source_url = None
+    location = self.CombineLocation(job_data)
+    if location:
+      analysis.location = location
+    await self.SaveAnalysisResult(job_id, analysis, job_data, duplicate_of = dup_of)
+    logger.info(f"🧬 Job {job_id}, job {dup_of} ilanının yakın kopyası (mesafe {distance}), analiz kopyalandı")
+    return True
+
+  async def SaveAnalysisResult( self, job_id: str, analysis_result, original_job: Dict, duplicate_of = None ):
+    # Ham LLM sözlüğü ya da jobAnalysis kabul edilir; normalize edilmiş kompakt v2 kaydı yazılır
     try:
+      analysis = analysis_result if isinstance(analysis_result, jobAnalysis) else jobAnalysis.FromDict(analysis_result)
       source_url = original_job.get('source_url', original_job.get('url', ''))
       if source_url:
-        analysis_result['source_url'] = source_url
-      analysis_doc = {
-        "job_id": job_id,
-        "analysis_result": analysis_result,
-        "processed_at": datetime.now(),
-        "processor_version": "1.0"
-      }
-      await db.InsertOne("job_analysis_results", analysis_doc)
+        analysis.source_url = source_url
+      await db.InsertOne(ANALYSIS_COLLECTION, BuildAnalysisDoc(job_id, analysis, duplicate_of))
       logger.info(f"✅ Analiz sonucu kaydedildi job {job_id} (source_url: {source_url[:50] if source_url else 'YOK'}...)")
     except Exception as e:
       logger.error(f"❌ Analiz sonucu kaydedilemedi job {job_id}: {e}")
       raise
 
+  def ClaimableQuery( self ) -> Dict:
+    # Lease zamanları UTC: Mongo naive datetime'ı UTC sayar, farklı saat dilimindeki işçiler aynı süreyi görür
+    return {
+      "processed": {"$ne": True},
+      "$or": [
+        {"lease_until": {"$exists": False}},
+        {"lease_until": None},
+        {"lease_until": {"$lt": datetime.now(timezone.utc)}}
+      ]
+    }
+
+  async def ClaimJob( self, job_id = None ) -> Optional[Dict]:
+    now = datetime.now(timezone.utc)
+    query = self.ClaimableQuery()
+    if job_id is not None:
+      query["_id"] = job_id
+    job = await db.FindOneAndUpdate(
+      "raw_jobs",
+      query,
+      {
+        "$set": {"lease_owner": self.worker_id, "lease_until": now + timedelta(seconds = self.lease_seconds)},
+        "$inc": {"lease_attempts": 1}
+      },
+      s = [("_id", 1)],
+      projection = RAW_JOB_PROJECTION
+    )
+    if not job:
+      return None
+    prev_owner = job.get("lease_owner")
+    if prev_owner and prev_owner != self.worker_id:
+      logger.info(f"♻️ Job {job['_id']} süresi dolmuş lease'den geri alındı (önceki sahip: {prev_owner})")
+    self.held_jobs.add(job["_id"])
+    return job
+
+  async def RenewLeases( self ):
+    if not self.held_jobs:
+      return
+    await db.UpdateMany(
+      "raw_jobs",
+      {"_id": {"$in": list(self.held_jobs)}, "lease_owner": self.worker_id},
+      {"$set": {"lease_until": datetime.now(timezone.utc) + timedelta(seconds = self.lease_seconds)}}
+    )
+
+  async def HeartbeatLoop( self ):
+    interval = max(1, self.lease_seconds // 3)
+    while True:
+      await asyncio.sleep(interval)
+      try:
+        await self.RenewLeases()
+      except Exception as e:
+        logger.error(f"❌ Lease yenileme hatası: {e}")
+
+  async def ReleaseJob( self, job_id ):
+    # Başarısız işler hemen değil, retry_delay sonunda tekrar alınabilir
+    self.held_jobs.discard(job_id)
+    await db.UpdateOne(
+      "raw_jobs",
+      {"_id": job_id, "lease_owner": self.worker_id},
+      {"$set": {"lease_owner": None, "lease_until": datetime.now(timezone.utc) + timedelta(seconds = self.retry_delay_seconds)}}
+    )
+
   async def MarkJobAsProcessed( self, job_id ):
     try:
-      job = await db.FindOne("raw_jobs", {"_id": job_id})
-      if not job:
-        logger.warning(f"⚠️ Job {job_id} raw_jobs koleksiyonunda bulunamadı")
-        return
-      await db.UpdateOne(
+      self.held_jobs.discard(job_id)
+      res = await db.UpdateOne(
         "raw_jobs",
         {"_id": job_id},
-        {"$set": {"processed": True, "processed_at": datetime.now()}}
+        {
+          "$set": {"processed": True, "processed_at": datetime.now()},
+          "$unset": {"lease_owner": "", "lease_until": ""}
+        }
       )
+      if res is not None and not res.matched_count:
+        logger.warning(f"⚠️ Job {job_id} raw_jobs koleksiyonunda bulunamadı")
+        return
       logger.info(f"✅ Job {job_id} işlendi olarak işaretlendi")
     except Exception as e:
       logger.error(f"❌ Job {job_id} işlendi olarak işaretlenemedi: {e}")
 
+  async def MarkJobsAsProcessed( self, job_ids: List ):
+    if not job_ids:
+      return
+    for job_id in job_ids:
+      self.held_jobs.discard(job_id)
+    res = await db.UpdateMany(
+      "raw_jobs",
+      {"_id": {"$in": list(job_ids)}},
+      {
+        "$set": {"processed": True, "processed_at": datetime.now()},
+        "$unset": {"lease_owner": "", "lease_until": ""}
+      }
+    )
+    if res is not None:
+      logger.info(f"✅ {res.matched_count}/{len(job_ids)} job işlendi olarak işaretlendi")
+
   async def GetUnprocessedJobs( self, limit: int = None ) -> List[Dict]:
     try:
-      query = {"processed": {"$ne": True}}
-      jobs = await db.FindMany("raw_jobs", query, limit or self.batch_size)
-      if not jobs:
-        logger.info("'processed' alanı olan iş bulunamadı, tüm işler alınıyor...")
-        jobs = await db.FindMany("raw_jobs", {}, limit or self.batch_size)
-      logger.info(f"📊 {len(jobs)} iş işlenmemiş olarak bulundu")
+      jobs = []
+      for _ in range(limit or self.batch_size):
+        job = await self.ClaimJob()
+        if not job:
+          break
+        jobs.append(job)
+      logger.info(f"📊 {len(jobs)} işlenmemiş iş claim edildi (worker: {self.worker_id})")
       return jobs
     except Exception as e:
       logger.error(f"❌ İşlenmemiş işler alınamadı: {e}")
       return []
 
-  async def ProcessSingleJob( self, job_data: Dict ) -> bool:
+  async def HasClaimableJobs( self ) -> bool:
+    return await db.Exists("raw_jobs", self.ClaimableQuery())
+
+  async def ProcessSingleJob( self, job_data: Dict, analyzed_ids: Optional[set] = None, marks: Optional[List] = None ) -> bool:
+    # analyzed_ids/marks verilirse kontrol ve işaretleme batch seviyesinde toplu yapılır
     job_id = job_data.get('_id')
+
+    async def mark():
+      if marks is not None:
+        marks.append(job_id)
+      else:
+        await self.MarkJobAsProcessed(job_id)
+
     try:
       logger.info(f"🔄 Job {job_id} işleniyor")
-      if await self.IsJobAlreadyAnalyzed(job_id):
+      if analyzed_ids is not None:
+        already = job_id in analyzed_ids
+      else:
+        already = await self.IsJobAlreadyAnalyzed(job_id)
+      if already:
         logger.info(f"⚠️ Job {job_id} zaten analiz edilmiş, atlanıyor")
-        await self.MarkJobAsProcessed(job_id)
+        await mark()
         self.skipped_count += 1
+        performance_monitor.TrackPipelineItems("job_processor", "skipped")
         return True
       job_text = self.CombineJobText(job_data)
       if not job_text or len(job_text.strip()) < 10:
         logger.warning(f"⚠️ Job {job_id} yeterli metne sahip değil, atlanıyor")
-        await self.MarkJobAsProcessed(job_id)
+        await mark()
         self.skipped_count += 1
+        performance_monitor.TrackPipelineItems("job_processor", "skipped")
         return True
+      fingerprint = None
+      if self.fingerprint_index:
+        fingerprint = self.fingerprint_index.Compute(job_data.get('description', ''))
+        if fingerprint is not None and await self.CloneNearDuplicateAnalysis(job_id, job_data, fingerprint):
+          await mark()
+          self.duplicate_count += 1
+          performance_monitor.TrackPipelineItems("job_processor", "duplicate")
+          return True
       analysis_result = await self.ProcessJobWithNlpApi(job_text, job_id)
       if not analysis_result:
         logger.info(f"🔄 NLP API başarısız oldu job {job_id}, Playwright deneniyor...")
@@ -177,56 +351,184 @@ class jobProcessor:
       if not analysis_result:
         logger.error(f"❌ Hem NLP API hem Playwright başarısız oldu job {job_id}")
         self.error_count += 1
+        performance_monitor.TrackPipelineItems("job_processor", "error")
         return False
       await self.SaveAnalysisResult(job_id, analysis_result, job_data)
-      await self.MarkJobAsProcessed(job_id)
+      if fingerprint is not None:
+        await self.fingerprint_index.Add(job_id, fingerprint)
+      await mark()
       self.success_count += 1
+      performance_monitor.TrackPipelineItems("job_processor", "success")
       logger.info(f"✅ Job {job_id} başarıyla işlendi")
       return True
     except Exception as e:
       logger.error(f"❌ Beklenmeyen hata job {job_id} işlenirken: {e}")
       self.error_count += 1
+      performance_monitor.TrackPipelineItems("job_processor", "error")
       return False
 
+  async def ProcessBatch( self, jobs: List[Dict] ) -> List[bool]:
+    results: List[bool] = [False] * len(jobs)
+    durations: List[float] = [0.0] * len(jobs)
+    analyzed_ids = await self.GetAnalyzedJobIds([job.get('_id') for job in jobs])
+    marks: List = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for idx, job in enumerate(jobs):
+      queue.put_nowait((idx, job))
+
+    async def worker():
+      while True:
+        try:
+          idx, job = queue.get_nowait()
+        except asyncio.QueueEmpty:
+          return
+        started = time.monotonic()
+        results[idx] = await self.ProcessSingleJob(job, analyzed_ids, marks)
+        if not results[idx]:
+          await self.ReleaseJob(job.get('_id'))
+        durations[idx] = time.monotonic() - started
+
+    await asyncio.gather(*[worker() for _ in range(min(self.concurrency, len(jobs)))])
+    await self.MarkJobsAsProcessed(marks)
+    for idx, job in enumerate(jobs):
+      status = "✅" if results[idx] else "❌"
+      logger.info(f"{status} [{idx + 1}/{len(jobs)}] Job {job.get('_id')} ({durations[idx]:.2f}s)")
+    return results
+
   async def ProcessAllJobs( self ):
     logger.info("🚀 İş işleme başlatılıyor...")
     total_processed = 0
     consecutive_empty_batches = 0
     max_empty_batches = 3
-    while True:
-      jobs = await self.GetUnprocessedJobs(self.batch_size)
-      if not jobs:
-        consecutive_empty_batches += 1
-        logger.info(f"📭 İşlenmemiş iş bulunamadı (boş batch {consecutive_empty_batches}/{max_empty_batches})")
-        if consecutive_empty_batches >= max_empty_batches:
-          logger.info("📭 Maksimum boş batch sayısına ulaşıldı, duruluyor...")
-          break
-        await asyncio.sleep(5)
-        continue
-      consecutive_empty_batches = 0
-      logger.info(f"📦 {len(jobs)} işten oluşan batch işleniyor")
-      for job in jobs:
-        success = await self.ProcessSingleJob(job)
-        total_processed += 1
-        await asyncio.sleep(1)
-      logger.info(f"📊 Batch tamamlandı. Toplam işlenen: {total_processed}")
-      remaining_jobs = await self.GetUnprocessedJobs(1)
-      if not remaining_jobs:
-        logger.info("📭 İşlenecek başka iş kalmadı")
-        break
+    heartbeat = asyncio.create_task(self.HeartbeatLoop())
+    try:
+      with performance_monitor.PipelineRun("job_processor"):
+        while True:
+          jobs = await self.GetUnprocessedJobs(self.batch_size)
+          if not jobs:
+            consecutive_empty_batches += 1
+            logger.info(f"📭 İşlenmemiş iş bulunamadı (boş batch {consecutive_empty_batches}/{max_empty_batches})")
+            if consecutive_empty_batches >= max_empty_batches:
+              logger.info("📭 Maksimum boş batch sayısına ulaşıldı, duruluyor...")
+              break
+            await asyncio.sleep(5)
+            continue
+          consecutive_empty_batches = 0
+          logger.info(f"📦 {len(jobs)} işten oluşan batch işleniyor (eşzamanlılık: {self.concurrency})")
+          await self.ProcessBatch(jobs)
+          total_processed += len(jobs)
+          logger.info(f"📊 Batch tamamlandı. Toplam işlenen: {total_processed}")
+          if not await self.HasClaimableJobs():
+            logger.info("📭 İşlenecek başka iş kalmadı")
+            break
+    finally:
+      heartbeat.cancel()
+      for job_id in list(self.held_jobs):
+        await self.ReleaseJob(job_id)
     logger.info("=" * 60)
     logger.info("📊 FİNAL İŞLEME İSTATİSTİKLERİ")
     logger.info("=" * 60)
     logger.info(f"Toplam işlenen iş: {total_processed}")
     logger.info(f"Başarıyla analiz edilen: {self.success_count}")
     logger.info(f"Atlanan (zaten analizli): {self.skipped_count}")
+    logger.info(f"Yakın kopyadan kopyalanan: {self.duplicate_count}")
     logger.info(f"Başarısız: {self.error_count}")
+    if self.extraction_cache:
+      logger.info(f"Önbellek isabet/ıska: {self.extraction_cache.hits}/{self.extraction_cache.misses}")
     if total_processed > 0:
-      success_rate = ((self.success_count + self.skipped_count) / total_processed * 100)
+      success_rate = ((self.success_count + self.skipped_count + self.duplicate_count) / total_processed * 100)
       logger.info(f"Genel başarı oranı: {success_rate:.2f}%")
     logger.info("=" * 60)
 
-  async def Cleanup( self ):
+  async def LoadResumeToken( self ):
+    doc = await db.FindOne(PIPELINE_STATE_COLLECTION, {"_id": "job_processor:raw_jobs"})
+    return doc.get("resume_token") if doc else None
+
+  async def SaveResumeToken( self, token ):
+    await db.UpdateOne(
+      PIPELINE_STATE_COLLECTION,
+      {"_id": "job_processor:raw_jobs"},
+      {"$set": {"resume_token": token, "updated_at": datetime.now()}},
+      upsert = True
+    )
+
+  async def DrainClaimableJobs( self ):
+    while True:
+      jobs = await self.GetUnprocessedJobs(self.batch_size)
+      if not jobs:
+        return
+      await self.ProcessBatch(jobs)
+
+  async def ProcessJobIds( self, job_ids: List ):
+    jobs = []
+    for job_id in job_ids:
+      # Başka worker'ın aldığı ya da zaten işlenmiş kayıtlar claim edilemez ve atlanır
+      job = await self.ClaimJob(job_id)
+      if job:
+        jobs.append(job)
+    if jobs:
+      logger.info(f"📥 {len(jobs)}/{len(job_ids)} yeni iş change stream'den alındı")
+      await self.ProcessBatch(jobs)
+
+  async def WatchInserts( self, max_wait: float, sweep_interval: float ):
+    token = await self.LoadResumeToken()
+    pending: List = []
+    async with db.Watch("raw_jobs", [{"$match": {"operationType": "insert"}}], token, int(max_wait * 1000)) as stream:
+      # İlk try_next akışı sunucuda başlatır; tarama ondan sonra yapılır ki arada eklenen işler kaçmasın
+      change = await stream.try_next()
+      logger.info(f"👀 raw_jobs insert'leri izleniyor ({'kaldığı yerden' if token else 'baştan'})")
+      await self.DrainClaimableJobs()
+      last_sweep = time.monotonic()
+      while stream.alive:
+        if change is not None:
+          pending.append(change["documentKey"]["_id"])
+        if pending and (change is None or len(pending) >= self.batch_size):
+          await self.ProcessJobIds(pending)
+          pending = []
+          # Token yalnızca batch işlendikten sonra kaydedilir; yarıda kalan batch yeniden oynatılır
+          await self.SaveResumeToken(stream.resume_token)
+        if change is None and time.monotonic() - last_sweep >= sweep_interval:
+          # ReleaseJob ile bırakılan ya da lease'i dolan işler insert üretmez; boşta periyodik taramayla alınır
+          await self.DrainClaimableJobs()
+          last_sweep = time.monotonic()
+        change = await stream.try_next()
+
+  async def PollNewJobs( self, interval: float ):
+    while True:
+      jobs = await self.GetUnprocessedJobs(self.batch_size)
+      if jobs:
+        await self.ProcessBatch(jobs)
+      else:
+        await asyncio.sleep(interval)
+
+  async def ConsumeNewJobs( self, max_wait: float = 5.0, sweep_interval: float = None ):
+    """Uzun ömürlü tüketici: token_requester'ın eklediği işleri beklemeden analiz eder."""
+    logger.info("🚀 Yeni iş tüketicisi başlatılıyor...")
+    # Varsayılan tarama aralığı: bırakılan işin tekrar alınabilir olduğu süre
+    sweep_interval = sweep_interval if sweep_interval is not None else self.retry_delay_seconds
+    heartbeat = asyncio.create_task(self.HeartbeatLoop())
+    try:
+      while True:
+        try:
+          # Bekleyen işler WatchInserts içinde, akış açıldıktan sonra taranır
+          await self.WatchInserts(max_wait, sweep_interval)
+        except OperationFailure as e:
+          if e.code in CHANGE_STREAM_UNSUPPORTED:
+            logger.warning("⚠️ Change stream desteklenmiyor (replica set değil), yoklamaya geçiliyor")
+            await self.PollNewJobs(max_wait)
+            return
+          if e.code not in CHANGE_STREAM_HISTORY_LOST:
+            raise
+          logger.warning(f"⚠️ Resume token geçersiz ({e.code}), akış yeniden başlatılıp bekleyen işler taranıyor")
+          await self.SaveResumeToken(None)
+    finally:
+      heartbeat.cancel()
+      for job_id in list(self.held_jobs):
+        await self.ReleaseJob(job_id)
+
+  async def Cleanup( self, close_http_client: bool = True ):
+    if close_http_client:
+      await CloseMistralClient()
     if self.job_analyzer:
       await self.job_analyzer.close()
       logger.info("🧹 Temizlik tamamlandı")
@@ -236,19 +538,29 @@ async def Main():
   parser = argparse.ArgumentParser(description = "Veritabanındaki işleri NLP API ile işle")
   parser.add_argument('--batch-size', type = int, default = 10, help = 'İşleme batch boyutu')
   parser.add_argument('--max-retries', type = int, default = 3, help = 'Her iş için maksimum deneme')
+  parser.add_argument('--concurrency', type = int, default = 1, help = 'Aynı anda işlenecek iş sayısı')
+  parser.add_argument('--rate', type = float, default = float(os.getenv("MISTRAL_RPS", "1")), help = 'Saniye başına Mistral API isteği (0 = sınırsız)')
+  parser.add_argument('--burst', type = int, default = int(os.getenv("MISTRAL_BURST", "1")), help = 'Rate limit patlama kapasitesi')
   parser.add_argument('--test-single', type = str, help = 'Tek bir iş ID ile test')
+  parser.add_argument('--watch', action = 'store_true', help = "raw_jobs insert'lerini izleyerek sürekli çalış")
   args = parser.parse_args()
   processor = jobProcessor(
     batch_size = args.batch_size,
-    max_retries = args.max_retries
+    max_retries = args.max_retries,
+    concurrency = args.concurrency,
+    rate = args.rate,
+    burst = args.burst
   )
   try:
+    await db.EnsureIndexes()
     if args.test_single:
-      job = await db.FindOne("raw_jobs", {"_id": args.test_single})
+      job = await db.FindOne("raw_jobs", {"_id": args.test_single}, projection = RAW_JOB_PROJECTION)
       if job:
         await processor.ProcessSingleJob(job)
       else:
         logger.error(f"Job {args.test_single} bulunamadı")
+    elif args.watch:
+      await processor.ConsumeNewJobs()
     else:
       await processor.ProcessAllJobs()
   except KeyboardInterrupt:
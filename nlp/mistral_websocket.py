@@ -256,11 +256,8 @@ class mistralWebSocketClient:
 
   async def LoadProxies(self) -> List[str]:
     try:
-      from dbprocess.db_manager import dbManager
-      uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-      db_name = os.getenv("MONGODB_DB", "jobscrapper")
-      db_manager = dbManager(uri, db_name)
-      proxies = await db_manager.FindMany("successlinkedin", {}, limit = 50)
+      from dbprocess.db_manager import db
+      proxies = await db.FindMany("successlinkedin", {}, lim = 50, projection = {"proxy": 1, "_id": 0})
       return [proxy['proxy'] for proxy in proxies]
     except Exception as exc:
       logger.warning(f"Proxy yükleme hatası: {exc}")
@@ -6,21 +6,76 @@ import time
 import logging
 from dotenv import load_dotenv
 
-from dbprocess.db_manager import dbManager
+from dbprocess.db_manager import db
 
 load_dotenv()
-MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-MONGODB_DB = os.getenv("MONGODB_DB", "jobscrapper")
-dbmanager = dbManager(MONGODB_URI, MONGODB_DB)
 
-async def GenerateLatexCv(prompt: str, retries: int = 3, retry_delay: float = 1.0) -> str:
+class mistralHttpClient:
+  """api.mistral.ai için tembel oluşturulan, bağlantıları yeniden kullanan paylaşımlı oturum."""
+  def __init__(self, limit: int = 100, limit_per_host: int = 20, keepalive_timeout: float = 60.0, total_timeout: float = 300.0):
+    self.limit = limit
+    self.limit_per_host = limit_per_host
+    self.keepalive_timeout = keepalive_timeout
+    self.total_timeout = total_timeout
+    self.session = None
+    self.loop = None
+
+  async def GetSession(self) -> aiohttp.ClientSession:
+    loop = asyncio.get_running_loop()
+    if self.session is None or self.session.closed or self.loop is not loop:
+      await self._Discard()
+      connector = aiohttp.TCPConnector(
+        limit = self.limit,
+        limit_per_host = self.limit_per_host,
+        keepalive_timeout = self.keepalive_timeout,
+        ttl_dns_cache = 300,
+        enable_cleanup_closed = True
+      )
+      self.session = aiohttp.ClientSession(
+        connector = connector,
+        timeout = aiohttp.ClientTimeout(total = self.total_timeout)
+      )
+      self.loop = loop
+    return self.session
+
+  async def _Discard(self):
+    # Loop değiştiyse eski oturum kendi loop'unda kapatılır; loop kapanmışsa soketler
+    # yine kapatılmaya çalışılır ve oturum ayrılır ki "Unclosed client session" uyarısı kalmasın
+    session, old_loop = self.session, self.loop
+    self.session = None
+    self.loop = None
+    if session is None or session.closed:
+      return
+    if old_loop is not None and old_loop is not asyncio.get_running_loop() and old_loop.is_running():
+      asyncio.run_coroutine_threadsafe(session.close(), old_loop)
+      return
+    try:
+      await session.close()
+    except Exception as exc:
+      logging.debug(f"Eski Mistral oturumu kapatılamadı: {exc}")
+      session.detach()
+
+  async def Close(self):
+    await self._Discard()
+
+mistral_client = mistralHttpClient(
+  limit = int(os.getenv("MISTRAL_HTTP_LIMIT", "100")),
+  limit_per_host = int(os.getenv("MISTRAL_HTTP_LIMIT_PER_HOST", "20")),
+  keepalive_timeout = float(os.getenv("MISTRAL_HTTP_KEEPALIVE", "60")),
+  total_timeout = float(os.getenv("MISTRAL_HTTP_TIMEOUT", "300"))
+)
+
+async def CloseMistralClient():
+  await mistral_client.Close()
+
+def LatexCvRequest(prompt: str, stream: bool = False) -> tuple:
   api_key = os.getenv("MISTRAL_API_KEY")
   if not api_key:
     raise EnvironmentError("MISTRAL_API_KEY .env dosyasında bulunamadı!")
   url = "https://api.mistral.ai/v1/chat/completions"
   headers = {
     "Content-Type": "application/json",
-    "Accept": "application/json",
+    "Accept": "text/event-stream" if stream else "application/json",
     "Authorization": f"Bearer {api_key}"
   }
   payload = {
@@ -32,18 +87,24 @@ async def GenerateLatexCv(prompt: str, retries: int = 3, retry_delay: float = 1.
       {"role": "user", "content": prompt}
     ]
   }
+  if stream:
+    payload["stream"] = True
+  return url, headers, payload
+
+async def GenerateLatexCv(prompt: str, retries: int = 3, retry_delay: float = 1.0) -> str:
+  url, headers, payload = LatexCvRequest(prompt)
 
   attempt = 0
   while attempt <= retries:
     try:
-      async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers = headers, json = payload) as response:
-          if response.status == 200:
-            data = await response.json()
-            latex_result = data['choices'][0]['message']['content']
-            return latex_result
-          else:
-            logging.warning(f"Yanıt {response.status}: {await response.text()}")
+      session = await mistral_client.GetSession()
+      async with session.post(url, headers = headers, json = payload) as response:
+        if response.status == 200:
+          data = await response.json()
+          latex_result = data['choices'][0]['message']['content']
+          return latex_result
+        else:
+          logging.warning(f"Yanıt {response.status}: {await response.text()}")
     except aiohttp.ClientError as exc:
       logging.error(f"İstek hatası: {exc}")
     attempt += 1
@@ -52,6 +113,62 @@ async def GenerateLatexCv(prompt: str, retries: int = 3, retry_delay: float = 1.
       await asyncio.sleep(retry_delay)
   raise Exception("API yanıtı alınamadı veya tekrar limiti aşıldı.")
 
+async def StreamLatexCv(prompt: str):
+  """GenerateLatexCv'nin `stream` modlu hali; içerik parçalarını geldikçe döndürür."""
+  url, headers, payload = LatexCvRequest(prompt, stream = True)
+  session = await mistral_client.GetSession()
+  # Uzun üretimlerde toplam süre değil, parçalar arası bekleme sınırlanır
+  timeout = aiohttp.ClientTimeout(total = None, sock_read = 120)
+  async with session.post(url, headers = headers, json = payload, timeout = timeout) as response:
+    if response.status != 200:
+      raise Exception(f"Yanıt {response.status}: {await response.text()}")
+    async for raw_line in response.content:
+      line = raw_line.decode("utf-8").strip()
+      if not line.startswith("data:"):
+        continue
+      data = line[len("data:"):].strip()
+      if data == "[DONE]":
+        break
+      try:
+        delta = json.loads(data)["choices"][0].get("delta", {})
+      except (KeyError, IndexError, json.JSONDecodeError) as exc:
+        logging.warning(f"Akış parçası ayrıştırılamadı: {exc}")
+        continue
+      content = delta.get("content")
+      if content:
+        yield content
+
+EXTRACTION_MODEL = "codestral-2405"
+EXTRACTION_SCHEMA_VERSION = "1"
+EXTRACTION_SYSTEM_PROMPT = (
+  "You are a senior HR-data extractor.\n\n"
+  "—TASK—\n"
+  "Extract structured data from ANY job posting text and output only a single-line, minified, valid JSON object "
+  "that matches this exact schema (no extra keys, no comments):\n"
+  '{"company_name":null,"job_title":"","department":null,"employment_type":null,"location":null,'
+  '"summary":null,"keywords":[],"responsibilities":[],'
+  '"requirements":{"education":[],"experience_years_min":null,"experience_years_pref":null,'
+  '"skills_mandatory":[],"skills_optional":[],"certifications":[],"languages":[],"other_requirements":[]},'
+  '"benefits":[],"application":{"apply_url":null,"contact_email":null,"deadline":null}}\n\n'
+  "—RULES—\n"
+  "1. Preserve the key order of the schema.\n"
+  "2. Use null where information is missing, never empty strings except for job_title.\n"
+  "3. Use empty arrays [] for list-type fields with no data.\n"
+  "4. Output must be a single line (no linebreaks, no indentation).\n"
+  "5. Do NOT wrap the JSON in markdown fences or add any extra text.\n"
+  "6. Normalize dates to ISO 8601 (\"YYYY-MM-DD\") if deadline is present; otherwise keep as null.\n"
+  "7. Translate field values to English except the original summary and location.\n"
+  "8. Trim whitespace inside strings; do not add trailing commas.\n"
+  "9. If the input contains multiple languages, prioritise English terms; keep Turkish only when no English equivalent exists.\n"
+  "10. Items appearing under headings such as \"Preferred\", \"Tercih edilen\", or preceded by words like \"Tercihen\" MUST be captured in skills_optional.\n"
+  "11. Split comma- or slash-separated skill lists into individual elements.\n"
+  "12. If a skill is both mandatory and preferred, list it in skills_mandatory and ALSO in skills_optional only if explicitly in preferred section.\n"
+  "13. Use canonical English technology names (e.g., TypeScript, PrimeNG, Angular).\n"
+  "14. **keywords** must be an array of up to 15 distinct, lower-case English keywords or key phrases that best represent the role (e.g., technologies, methodologies, domain terms).  \n    • Derive them from any section of the posting.  \n    • Remove duplicates and synonyms; keep concise.  \n    • Maintain original casing only for proper technology names (e.g., \"Spring Boot\").  \n    • Avoid generic words like \"team\", \"company\", \"work\".  \n"
+  "15. Output ALL fields in English, even if the original job posting is in Turkish. Only the summary and location fields may remain in Turkish if no English equivalent exists.\n"
+  "\nFailure to comply with any rule is a critical error."
+)
+
 async def ExtractJobData(job_description: str, retries: int = 5, retry_delay: float = 1.0) -> dict:
   api_key = os.getenv("MISTRAL_API_KEY")
   if not api_key:
@@ -63,41 +180,14 @@ async def ExtractJobData(job_description: str, retries: int = 5, retry_delay: fl
     "Authorization": f"Bearer {api_key}"
   }
   payload = {
-    "model": "codestral-2405",
+    "model": EXTRACTION_MODEL,
     "temperature": 0.1,
     "max_tokens": 32768,
     "response_format": {"type": "json_object"},
     "messages": [
       {
         "role": "system",
-        "content": (
-          "You are a senior HR-data extractor.\n\n"
-          "—TASK—\n"
-          "Extract structured data from ANY job posting text and output only a single-line, minified, valid JSON object "
-          "that matches this exact schema (no extra keys, no comments):\n"
-          '{"company_name":null,"job_title":"","department":null,"employment_type":null,"location":null,'
-          '"summary":null,"keywords":[],"responsibilities":[],'
-          '"requirements":{"education":[],"experience_years_min":null,"experience_years_pref":null,'
-          '"skills_mandatory":[],"skills_optional":[],"certifications":[],"languages":[],"other_requirements":[]},'
-          '"benefits":[],"application":{"apply_url":null,"contact_email":null,"deadline":null}}\n\n'
-          "—RULES—\n"
-          "1. Preserve the key order of the schema.\n"
-          "2. Use null where information is missing, never empty strings except for job_title.\n"
-          "3. Use empty arrays [] for list-type fields with no data.\n"
-          "4. Output must be a single line (no linebreaks, no indentation).\n"
-          "5. Do NOT wrap the JSON in markdown fences or add any extra text.\n"
-          "6. Normalize dates to ISO 8601 (\"YYYY-MM-DD\") if deadline is present; otherwise keep as null.\n"
-          "7. Translate field values to English except the original summary and location.\n"
-          "8. Trim whitespace inside strings; do not add trailing commas.\n"
-          "9. If the input contains multiple languages, prioritise English terms; keep Turkish only when no English equivalent exists.\n"
-          "10. Items appearing under headings such as \"Preferred\", \"Tercih edilen\", or preceded by words like \"Tercihen\" MUST be captured in skills_optional.\n"
-          "11. Split comma- or slash-separated skill lists into individual elements.\n"
-          "12. If a skill is both mandatory and preferred, list it in skills_mandatory and ALSO in skills_optional only if explicitly in preferred section.\n"
-          "13. Use canonical English technology names (e.g., TypeScript, PrimeNG, Angular).\n"
-          "14. **keywords** must be an array of up to 15 distinct, lower-case English keywords or key phrases that best represent the role (e.g., technologies, methodologies, domain terms).  \n    • Derive them from any section of the posting.  \n    • Remove duplicates and synonyms; keep concise.  \n    • Maintain original casing only for proper technology names (e.g., \"Spring Boot\").  \n    • Avoid generic words like \"team\", \"company\", \"work\".  \n"
-          "15. Output ALL fields in English, even if the original job posting is in Turkish. Only the summary and location fields may remain in Turkish if no English equivalent exists.\n"
-          "\nFailure to comply with any rule is a critical error."
-        )
+        "content": EXTRACTION_SYSTEM_PROMPT
       },
       {
         "role": "user",
@@ -108,15 +198,15 @@ async def ExtractJobData(job_description: str, retries: int = 5, retry_delay: fl
   attempt = 0
   while attempt <= retries:
     try:
-      async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers = headers, json = payload) as response:
-          if response.status == 200:
-            data = await response.json()
-            extracted_content = data['choices'][0]['message']['content']
-            structured_json = json.loads(extracted_content)
-            return structured_json
-          else:
-            logging.warning(f"Yanıt {response.status}: {await response.text()}")
+      session = await mistral_client.GetSession()
+      async with session.post(url, headers = headers, json = payload) as response:
+        if response.status == 200:
+          data = await response.json()
+          extracted_content = data['choices'][0]['message']['content']
+          structured_json = json.loads(extracted_content)
+          return structured_json
+        else:
+          logging.warning(f"Yanıt {response.status}: {await response.text()}")
     except aiohttp.ClientError as exc:
       logging.error(f"İstek hatası: {exc}")
     except (KeyError, json.JSONDecodeError) as exc:
@@ -129,7 +219,7 @@ async def ExtractJobData(job_description: str, retries: int = 5, retry_delay: fl
 
 async def SaveToDb(document: dict):
   try:
-    await dbmanager.InsertOne("JobAnalysis", document)
+    await db.InsertOne("JobAnalysis", document)
     print("Analiz JobAnalysis koleksiyonuna kaydedildi.")
   except Exception as db_exc:
     print(f"Analiz veritabanına kaydedilemedi: {db_exc}")
@@ -164,6 +254,8 @@ def Main():
     except Exception as exc:
       print(f"Hata: {exc}")
       logging.error(f"Ana çalışma hatası: {exc}")
+    finally:
+      await CloseMistralClient()
 
   asyncio.run(run())
 
@@ -1,12 +1,32 @@
+import os
 import time
+import atexit
 import logging
+from contextlib import contextmanager
 from typing import Dict, Optional
-from prometheus_client import Counter, Histogram, Gauge, generate_latest
 import asyncio
-from flask import Flask, Response
+
+# Çoklu süreç modunda metrik dosyaları metrikler oluşturulurken açılır; dizin önceden var olmalı
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROC_DIR:
+  os.makedirs(MULTIPROC_DIR, exist_ok = True)
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, Gauge, REGISTRY, generate_latest, multiprocess
 
 logger = logging.getLogger(__name__)
 
+def MetricsRegistry() -> CollectorRegistry:
+  """PROMETHEUS_MULTIPROC_DIR ayarlıysa tüm süreçlerin (API, scheduler alt süreçleri) metriklerini birleştirir."""
+  if not MULTIPROC_DIR:
+    return REGISTRY
+  registry = CollectorRegistry()
+  multiprocess.MultiProcessCollector(registry, path = MULTIPROC_DIR)
+  return registry
+
+if MULTIPROC_DIR:
+  # live* gauge'lar süreç bitince toplamdan düşsün; sayaç/histogram dosyaları korunur
+  atexit.register(multiprocess.mark_process_dead, os.getpid(), MULTIPROC_DIR)
+
 class performanceMonitor:
   def __init__(self):
     self.requests_counter = Counter(
@@ -22,7 +42,8 @@ class performanceMonitor:
     self.proxy_performance_gauge = Gauge(
       'proxy_performance_score',
       'Proxylerin performans skoru',
-      ['proxy']
+      ['proxy'],
+      multiprocess_mode = 'livemax'
     )
     self.proxy_requests_counter = Counter(
       'proxy_requests_total',
@@ -46,11 +67,58 @@ class performanceMonitor:
     )
     self.websocket_connections = Gauge(
       'websocket_connections_active',
-      'Aktif WebSocket bağlantıları'
+      'Aktif WebSocket bağlantıları',
+      multiprocess_mode = 'livesum'
     )
     self.browser_instances = Gauge(
       'browser_instances_active',
-      'Aktif tarayıcı instance sayısı'
+      'Aktif tarayıcı instance sayısı',
+      multiprocess_mode = 'livesum'
+    )
+    self.http_request_latency = Histogram(
+      'http_request_duration_seconds',
+      'Route başına HTTP istek süresi',
+      ['route', 'method'],
+      buckets = [0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300]
+    )
+    self.http_requests_in_flight = Gauge(
+      'http_requests_in_flight',
+      'İşlenmekte olan HTTP istekleri',
+      ['route', 'method'],
+      multiprocess_mode = 'livesum'
+    )
+    self.http_responses_counter = Counter(
+      'http_responses_total',
+      'Durum koduna göre HTTP yanıtları',
+      ['route', 'method', 'status']
+    )
+    self.span_histogram = Histogram(
+      'cv_generation_span_seconds',
+      'CV üretimi alt adım süreleri',
+      ['span'],
+      buckets = [0.001, 0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300]
+    )
+    self.cache_requests_counter = Counter(
+      'extraction_cache_requests_total',
+      'ExtractJobData önbellek istekleri',
+      ['backend', 'result']
+    )
+    self.pipeline_items_counter = Counter(
+      'pipeline_items_total',
+      'Pipeline adımlarının işlediği kayıtlar',
+      ['pipeline', 'result']
+    )
+    self.pipeline_run_histogram = Histogram(
+      'pipeline_run_duration_seconds',
+      'Pipeline çalıştırma süresi',
+      ['pipeline', 'status'],
+      buckets = [1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200]
+    )
+    self.pipeline_last_success = Gauge(
+      'pipeline_last_success_timestamp_seconds',
+      'Pipeline son başarılı bitiş zamanı',
+      ['pipeline'],
+      multiprocess_mode = 'max'
     )
 
   def TrackRequest(self, success: bool, method: str = "websocket"):
@@ -83,8 +151,39 @@ class performanceMonitor:
   def SetBrowserInstances(self, count: int):
     self.browser_instances.set(count)
 
+  def TrackHttpRequest(self, route: str, method: str, status: int, duration: float):
+    self.http_request_latency.labels(route = route, method = method).observe(duration)
+    self.http_responses_counter.labels(route = route, method = method, status = str(status)).inc()
+
+  @contextmanager
+  def Span(self, name: str):
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.span_histogram.labels(span = name).observe(time.perf_counter() - start)
+
+  def TrackCacheRequest(self, backend: str, hit: bool):
+    self.cache_requests_counter.labels(backend = backend, result = "hit" if hit else "miss").inc()
+
+  def TrackPipelineItems(self, pipeline: str, result: str, count: int = 1):
+    if count:
+      self.pipeline_items_counter.labels(pipeline = pipeline, result = result).inc(count)
+
+  @contextmanager
+  def PipelineRun(self, pipeline: str):
+    start = time.perf_counter()
+    status = "failed"
+    try:
+      yield
+      status = "success"
+    finally:
+      self.pipeline_run_histogram.labels(pipeline = pipeline, status = status).observe(time.perf_counter() - start)
+      if status == "success":
+        self.pipeline_last_success.labels(pipeline = pipeline).set_to_current_time()
+
   def GetMetrics(self) -> str:
-    return generate_latest().decode('utf-8')
+    return generate_latest(MetricsRegistry()).decode('utf-8')
 
 class requestTimer:
   def __init__(self, monitor: performanceMonitor, method: str = "websocket", min_duration: float = 0.01):
@@ -175,12 +274,5 @@ async def ExampleUsage():
   print(metrics)
 
 if __name__ == "__main__":
-  import argparse
-  parser = argparse.ArgumentParser(description = "Prometheus metrik sunucusu")
-  parser.add_argument('--port', type = int, default = 8000, help = 'Dinlenecek port')
-  args = parser.parse_args()
-  app = Flask(__name__)
-  @app.route('/metrics')
-  def metrics():
-    return Response(performance_monitor.GetMetrics(), mimetype = 'text/plain')
-  app.run(host = '0.0.0.0', port = args.port) 
\ No newline at end of file
+  # Metrikler API'nin /metrics endpoint'inden sunulur; bu giriş noktası yalnızca anlık dökümü yazdırır
+  print(performance_monitor.GetMetrics())
@@ -1,5 +1,8 @@
 import re
 import json
+from typing import Awaitable, Callable, Dict
+import time
+import asyncio
 import logging
 
 
@@ -39,4 +42,47 @@ def SafeExtractJsonFromResponse(response_text: str):
   logging.error(
     "Yanıtta JSON bulunamadı! Ham: %s\nTüm string: %s", response_text[:200], response_text
   )
-  return None 
\ No newline at end of file
+  return None 
+
+class tokenBucket:
+  """Saniyede `rate` istek, en fazla `capacity` patlama izni veren asenkron sınırlayıcı."""
+  def __init__(self, rate: float, capacity: int = 1):
+    self.rate = rate
+    self.capacity = max(1, capacity)
+    self.tokens = float(self.capacity)
+    self.updated = time.monotonic()
+    self.lock = asyncio.Lock()
+
+  async def Acquire(self):
+    if self.rate <= 0:
+      return
+    async with self.lock:
+      while True:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+          self.tokens -= 1
+          return
+        await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class singleFlight:
+  """Aynı anahtarla eşzamanlı gelen çağrıları tek bir çalıştırmada birleştirir."""
+  def __init__(self):
+    self.inflight: Dict[str, asyncio.Future] = {}
+
+  def _Done(self, key: str, task: asyncio.Future):
+    if self.inflight.get(key) is task:
+      del self.inflight[key]
+    if not task.cancelled():
+      task.exception()
+
+  async def Do(self, key: str, fn: Callable[[], Awaitable]):
+    task = self.inflight.get(key)
+    if task is None:
+      task = asyncio.ensure_future(fn())
+      self.inflight[key] = task
+      task.add_done_callback(lambda t: self._Done(key, t))
+    # Bir istemcinin iptali diğer bekleyenlerin üretimini iptal etmesin
+    return await asyncio.shield(task)
@@ -13,6 +13,7 @@ from datetime import datetime
 from typing import Dict
 
 from dbprocess.db_manager import db
+from nlp.performance_monitor import performance_monitor
 from .fetcher import async_fetch_proxies
 from .tester import (async_batch_https_test_db,
                      async_batch_linkedin_test_db)
@@ -42,9 +43,10 @@ class ProxyManager:
     async def _fetch_and_https_test(self):
         logger.info("[%s] Proxy çekme + HTTPS testi başlıyor…",
                     datetime.now().strftime("%F %T"))
-        proxies = await async_fetch_proxies(limit=5_000)
-        await async_batch_https_test_db(proxies, db,
-                                        timeout=3, print_every=1_000)
+        with performance_monitor.PipelineRun("proxy_https"):
+            proxies = await async_fetch_proxies(limit=5_000)
+            await async_batch_https_test_db(proxies, db,
+                                            timeout=3, print_every=1_000)
 
         self._stats["total_fetches"] += 1
         self._stats["last_fetch"] = datetime.now()
@@ -61,10 +63,11 @@ class ProxyManager:
     async def _linkedin_test_cycle(self):
         logger.info("[%s] LinkedIn testi başlıyor…",
                     datetime.now().strftime("%F %T"))
-        await async_batch_linkedin_test_db(db,
-                                           batch_size=500,
-                                           timeout=5,
-                                           print_every=100)
+        with performance_monitor.PipelineRun("proxy_linkedin"):
+            await async_batch_linkedin_test_db(db,
+                                               batch_size=500,
+                                               timeout=5,
+                                               print_every=100)
 
         self._stats["total_linkedin_tests"] += 1
         self._stats["last_linkedin"] = datetime.now()
@@ -77,6 +80,18 @@ class ProxyManager:
                     self._stats["successful_linkedin"],
                     self._stats["successful_https"])
 
+    # --------------------------------------------------------------------- #
+    # Zamanlanmış Tek Döngü
+    # --------------------------------------------------------------------- #
+    async def run_cycle(self):
+        """Scheduler için sonlanan tek tur: gerekirse çekme + HTTPS, ardından LinkedIn testi."""
+        await db.EnsureIndexes()
+        last_fetch = self._stats["last_fetch"]
+        if (last_fetch is None or
+                (datetime.now() - last_fetch).total_seconds() >= self.fetch_interval):
+            await self._fetch_and_https_test()
+        await self._linkedin_test_cycle()
+
     # --------------------------------------------------------------------- #
     # Sürekli Döngüler
     # --------------------------------------------------------------------- #
@@ -110,6 +125,7 @@ class ProxyManager:
 
     async def start_monitoring(self):
         self._is_running = True
+        await db.EnsureIndexes()
         logger.info("Proxy izleme sistemi başlatıldı.")
         tasks = [asyncio.create_task(self._run_fetch_loop()),
                  asyncio.create_task(self._run_linkedin_loop())]
@@ -129,6 +145,7 @@ class ProxyManager:
                           https_timeout: int = 3,
                           linkedin_timeout: int = 5):
         async def _pipeline():
+            await db.EnsureIndexes()
             proxies = await async_fetch_proxies(limit=limit)
             await async_batch_https_test_db(proxies, db,
                                             timeout=https_timeout)
@@ -9,11 +9,14 @@ import asyncio
 import logging
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import List
+from typing import AsyncIterable, Awaitable, Callable, List
 
 import aiohttp
 import requests
+from pymongo import DeleteOne, InsertOne, UpdateOne
 from dbprocess.db_manager import dbManager  # proje‑içi modül
+from dbprocess.write_buffer import writeBehindBuffer
+from nlp.performance_monitor import performance_monitor
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +52,59 @@ def filter_ports(proxy_list: List[str]) -> List[str]:
     return filtered
 
 
+async def for_each_bounded(items: AsyncIterable[str],
+                           work: Callable[[str], Awaitable[None]],
+                           concurrency: int = 200) -> None:
+    """
+    Async iterable'daki öğeleri en fazla `concurrency` eşzamanlı görevle
+    işler; bellekte yalnızca uçuştaki öğeler tutulur. Bir `work` hatasında
+    yeni öğe başlatılmaz, uçuştakiler bitince ilk hata fırlatılır; iterasyon
+    hata verirse uçuştaki görevler iptal edilip beklenir.
+    """
+    sem = asyncio.Semaphore(concurrency)
+    tasks: set = set()
+    errors: List[BaseException] = []
+
+    async def _run(item: str):
+        try:
+            await work(item)
+        finally:
+            sem.release()
+
+    def _done(task: asyncio.Task):
+        # Biten görev kümeden çıkar ama hatası kaybolmaz
+        tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            errors.append(task.exception())
+
+    try:
+        async for item in items:
+            if errors:
+                break
+            await sem.acquire()
+            task = asyncio.create_task(_run(item))
+            tasks.add(task)
+            task.add_done_callback(_done)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    if errors:
+        raise errors[0]
+
+
+async def stream_proxies(db: dbManager, col: str,
+                         batch_size: int = 1_000) -> AsyncIterable[str]:
+    """Koleksiyondaki tüm proxy adreslerini (yalnızca `proxy` alanı) akıtır."""
+    async for doc in db.Stream(col, {}, {"proxy": 1, "_id": 0},
+                               batch_size=batch_size):
+        if doc.get("proxy"):
+            yield doc["proxy"]
+
+
 # --------------------------------------------------------------------------- #
 # HTTPS – Senkron/Asenkron Testler
 # --------------------------------------------------------------------------- #
@@ -108,49 +164,48 @@ async def async_batch_https_test_db(proxy_list: List[str],
     koleksiyonunda saklar veya günceller.
     """
     if test_existing:
-        docs = await db.FindMany("successhttps", {}, lim=1_000)
-        if not docs:
+        total = await db.GetColCount("successhttps")
+        if not total:
             logger.info("[DB] Test edilecek HTTPS proxy kalmadı.")
             return []
-        proxy_list = [d["proxy"] for d in docs]
+    else:
+        total = len(proxy_list)
 
     working: List[str] = []
-    total = len(proxy_list)
     sem = asyncio.Semaphore(200)
     checked = success = 0
-    batch: List[dict] = []
-    failed: List[str] = []
 
     async def _work(proxy: str):
-        nonlocal checked, success, batch, failed
+        nonlocal checked, success
         async with sem:
             if await async_fast_https_test(proxy, timeout):
                 working.append(proxy)
                 if test_existing:
-                    await db.UpdateProxyTs("successhttps", proxy)
+                    await writes.Add(UpdateOne({"proxy": proxy},
+                                               {"$set": {"last_tested": datetime.now()}},
+                                               upsert=True))
                 else:
-                    batch.append({"proxy": proxy,
-                                  "added_at": datetime.now()})
+                    await writes.Add(InsertOne({"proxy": proxy,
+                                                "added_at": datetime.now()}))
                 success += 1
             elif test_existing:
-                failed.append(proxy)
+                await writes.Add(DeleteOne({"proxy": proxy}))
             checked += 1
 
             if checked % print_every == 0 or checked == total:
                 logger.info("[HTTPS ASYNC] %d/%d test edildi, başarılı: %d",
                             checked, total, success)
-                if batch and not test_existing:
-                    await db.InsertMany("successhttps", batch)
-                    logger.info("[DB] %d proxy eklendi.", len(batch))
-                    batch.clear()
-
-    await asyncio.gather(*[_work(p) for p in proxy_list])
-
-    if batch and not test_existing:
-        await db.InsertMany("successhttps", batch)
-    if test_existing and failed:
-        await db.DeleteMany("successhttps", {"proxy": {"$in": failed}})
-        logger.info("[DB] %d başarısız proxy silindi.", len(failed))
+
+    # Sonuç yazıları testlerle yarışmasın diye toplu yazılır
+    async with writeBehindBuffer(db, "successhttps") as writes:
+        if test_existing:
+            await for_each_bounded(stream_proxies(db, "successhttps"), _work)
+        else:
+            await asyncio.gather(*[_work(p) for p in proxy_list])
+    performance_monitor.TrackPipelineItems("proxy_https", "working", success)
+    performance_monitor.TrackPipelineItems("proxy_https", "failed", checked - success)
+    logger.info("[DB] successhttps: %d eklendi, %d silindi.",
+                writes.stats["inserted"], writes.stats["deleted"])
     return working
 
 
@@ -181,63 +236,67 @@ async def async_batch_linkedin_test_db(db: dbManager,
     successlinkedin kayıtlarını periyodik olarak doğrular.
     """
     if test_existing:
-        docs = await db.FindMany("successlinkedin", {}, lim=batch_size)
-        if not docs:
+        total = await db.GetColCount("successlinkedin")
+        if not total:
             logger.info("[DB] Test edilecek LinkedIn proxy kalmadı.")
             return
-        proxy_list = [d["proxy"] for d in docs]
-        failed: list[str] = []
-        sem = asyncio.Semaphore(200)
         checked = success = 0
 
         async def _work(proxy: str):
-            nonlocal checked, success, failed
-            async with sem:
-                if await async_linkedin_test(proxy, timeout):
-                    await db.UpdateProxyTs("successlinkedin", proxy)
-                    success += 1
-                else:
-                    failed.append(proxy)
-                checked += 1
-                if checked % print_every == 0 or checked == len(proxy_list):
-                    logger.info("[LINKEDIN EXIST] %d/%d test edildi, başarılı: %d",
-                                checked, len(proxy_list), success)
-
-        await asyncio.gather(*[_work(p) for p in proxy_list])
-        if failed:
-            await db.DeleteMany("successlinkedin",
-                                {"proxy": {"$in": failed}})
-            logger.info("[DB] %d başarısız proxy silindi.", len(failed))
+            nonlocal checked, success
+            if await async_linkedin_test(proxy, timeout):
+                await writes.Add(UpdateOne({"proxy": proxy},
+                                           {"$set": {"last_tested": datetime.now()}},
+                                           upsert=True))
+                success += 1
+            else:
+                await writes.Add(DeleteOne({"proxy": proxy}))
+            checked += 1
+            if checked % print_every == 0 or checked == total:
+                logger.info("[LINKEDIN EXIST] %d/%d test edildi, başarılı: %d",
+                            checked, total, success)
+
+        async with writeBehindBuffer(db, "successlinkedin") as writes:
+            await for_each_bounded(stream_proxies(db, "successlinkedin",
+                                                  batch_size=batch_size), _work)
+        performance_monitor.TrackPipelineItems("proxy_linkedin_recheck", "working", success)
+        performance_monitor.TrackPipelineItems("proxy_linkedin_recheck", "failed", checked - success)
+        logger.info("[DB] %d başarısız proxy silindi.", writes.stats["deleted"])
         return
 
     # --- successhttps koleksiyonunu LinkedIn için tarıyoruz ---
-    while True:
-        docs = await db.FindMany("successhttps", {}, lim=batch_size)
-        if not docs:
-            logger.info("[DB] İşlenecek HTTPS proxy kalmadı.")
-            break
-        proxy_list = [d["proxy"] for d in docs]
-        sem = asyncio.Semaphore(200)
-        checked = success = 0
-
-        async def _work(proxy: str, proxy_doc: dict):
-            nonlocal checked, success
-            async with sem:
-                result = await async_linkedin_test(proxy, timeout)
-                checked += 1
-                await db.DeleteOne("successhttps", {"proxy": proxy})
-                if result:
-                    proxy_doc.pop("_id", None)
-                    proxy_doc["added_at"] = datetime.now()
-                    await db.db["successlinkedin"].update_one(
-                        {"proxy": proxy_doc["proxy"]},
-                        {"$set": proxy_doc},
-                        upsert=True
-                    )
-                    success += 1
-                if checked % print_every == 0 or checked == len(proxy_list):
-                    logger.info("[LINKEDIN ASYNC] %d/%d test edildi, başarılı: %d",
-                                checked, len(proxy_list), success)
-
-        await asyncio.gather(*[_work(p, docs[i])
-                               for i, p in enumerate(proxy_list)])
+    async with writeBehindBuffer(db, "successhttps") as consumed, \
+            writeBehindBuffer(db, "successlinkedin") as promoted:
+        while True:
+            docs = await db.FindMany("successhttps", {}, lim=batch_size,
+                                     projection={"proxy": 1})
+            if not docs:
+                logger.info("[DB] İşlenecek HTTPS proxy kalmadı.")
+                break
+            proxy_list = [d["proxy"] for d in docs]
+            sem = asyncio.Semaphore(200)
+            checked = success = 0
+
+            async def _work(proxy: str):
+                nonlocal checked, success
+                async with sem:
+                    result = await async_linkedin_test(proxy, timeout)
+                    checked += 1
+                    await consumed.Add(DeleteOne({"proxy": proxy}))
+                    if result:
+                        await promoted.Add(UpdateOne(
+                            {"proxy": proxy},
+                            {"$set": {"proxy": proxy, "added_at": datetime.now()}},
+                            upsert=True
+                        ))
+                        success += 1
+                    if checked % print_every == 0 or checked == len(proxy_list):
+                        logger.info("[LINKEDIN ASYNC] %d/%d test edildi, başarılı: %d",
+                                    checked, len(proxy_list), success)
+
+            await asyncio.gather(*[_work(p) for p in proxy_list])
+            performance_monitor.TrackPipelineItems("proxy_linkedin", "working", success)
+            performance_monitor.TrackPipelineItems("proxy_linkedin", "failed", checked - success)
+            # Sonraki sayfa okunmadan silmeler yazılmalı, yoksa aynı proxy'ler tekrar gelir
+            await consumed.Flush()
+            await promoted.Flush()
@@ -1,16 +1,22 @@
 import os
+import time
 import asyncio
 import logging
 import subprocess
-from datetime import datetime, timedelta
-from fastapi.responses import PlainTextResponse
-from fastapi import FastAPI, HTTPException
+from datetime import datetime, timedelta, timezone
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from fastapi import Depends, FastAPI, HTTPException, Request
 from pydantic import BaseModel
 from typing import Literal
 import uvicorn
-import importlib
 
-from cv_generator.generate_ats_cv import GenerateAtsCv
+from cv_generator.service import cvGenerationService
+from cv_generator.cv_jobs import BuildCvJobQueue, cvJobQueueFull
+from dbprocess.db_manager import db, dbUnavailableError
+from nlp.nlpApi import CloseMistralClient
+from nlp.performance_monitor import performance_monitor
+from prometheus_client import CONTENT_TYPE_LATEST
+from starlette.routing import Match
 
 from guestscheduler.main_scheduler import scheduler, start_scheduler, shutdown_scheduler
 
@@ -26,82 +32,157 @@ class StartCommand(BaseModel):
 
 app = FastAPI()
 
+def RouteLabel(scope) -> str:
+    # Metrik etiketi olarak ham yol değil route şablonu kullanılır (kardinalite sınırlı kalsın)
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+class metricsMiddleware:
+    def __init__(self, asgi_app):
+        self.app = asgi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = RouteLabel(scope)
+        method = scope["method"]
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        in_flight = performance_monitor.http_requests_in_flight.labels(route=route, method=method)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            performance_monitor.TrackHttpRequest(route, method, status["code"], time.perf_counter() - start)
+
+app.add_middleware(metricsMiddleware)
+
+def get_cv_service(request: Request) -> cvGenerationService:
+    return request.app.state.cv_service
+
 # Logger konfigürasyonu
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@app.exception_handler(dbUnavailableError)
+async def db_unavailable_handler(request: Request, exc: dbUnavailableError):
+    # Tekrar denemeleri tükenmiş geçici veritabanı hatası: istemci sonra tekrar denesin
+    logger.error(f"Veritabanına ulaşılamadı ({request.url.path}): {exc}")
+    return JSONResponse(status_code=503, content={"detail": "Veritabanına şu anda ulaşılamıyor, lütfen daha sonra tekrar deneyin."}, headers={"Retry-After": "5"})
+
 @app.get("/")
 async def root():
     return {"message": "CV Maker API çalışıyor", "status": "active"}
 
+@app.get("/metrics")
+async def metrics():
+    return Response(content=performance_monitor.GetMetrics(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
-@app.post("/generate-cv")
-async def generate_cv(req: GenerateCvRequest):
+async def generate_latex(req: GenerateCvRequest, service: cvGenerationService) -> str:
     try:
-        if not asyncio.iscoroutinefunction(GenerateAtsCv):
-            loop = asyncio.get_event_loop()
-            latex_cv = await loop.run_in_executor(
-                None, GenerateAtsCv, req.raw_cv, req.job_id, req.target_lang
-            )
-        else:
-            latex_cv = await GenerateAtsCv(req.raw_cv, req.job_id, req.target_lang)
-        return {"latex_cv": latex_cv}
+        return await service.Generate(req.raw_cv, req.job_id, req.target_lang)
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
-    except Exception as exc:
+    except dbUnavailableError:
+        logger.exception("CV oluşturulurken veritabanına ulaşılamadı")
+        raise HTTPException(status_code=503, detail="Veritabanına şu anda ulaşılamıyor, lütfen daha sonra tekrar deneyin.")
+    except Exception:
         logger.exception("CV oluşturulurken beklenmeyen hata")
-        raise HTTPException(status_code=500, detail="Sunucu hatası, lütfen daha sonra tekrar deneyin.")
+        raise HTTPException(
+            status_code=500,
+            detail="Sunucu hatası, lütfen daha sonra tekrar deneyin."
+        )
+
+@app.post("/generate-cv")
+async def generate_cv(req: GenerateCvRequest, service: cvGenerationService = Depends(get_cv_service)):
+    return {"latex_cv": await generate_latex(req, service)}
 
 @app.post(
     "/generate-raw-cv",
     response_class=PlainTextResponse,
     summary="LaTeX ham metni döndürür"
 )
-async def generate_latex_raw(req: GenerateCvRequest) -> PlainTextResponse:
+async def generate_latex_raw(req: GenerateCvRequest, service: cvGenerationService = Depends(get_cv_service)) -> PlainTextResponse:
+    latex = await generate_latex(req, service)
+    return PlainTextResponse(content=latex, media_type="text/plain")
+
+def SseEvent(chunk: str, event: str = None) -> str:
+    lines = [f"event: {event}"] if event else []
+    lines += [f"data: {line}" for line in chunk.split("\n")]
+    return "\n".join(lines) + "\n\n"
+
+@app.post("/generate-cv-stream", summary="LaTeX çıktısını üretildikçe akıtır")
+async def generate_cv_stream(req: GenerateCvRequest, request: Request, service: cvGenerationService = Depends(get_cv_service)):
     try:
-        if not asyncio.iscoroutinefunction(GenerateAtsCv):
-            loop = asyncio.get_event_loop()
-            latex = await loop.run_in_executor(
-                None,
-                GenerateAtsCv,
-                req.raw_cv,
-                req.job_id,
-                req.target_lang
-            )
-        else:
-            latex = await GenerateAtsCv(
-                req.raw_cv,
-                req.job_id,
-                req.target_lang
-            )
-        return PlainTextResponse(content=latex, media_type="text/plain")
+        chunks = await service.Stream(req.raw_cv, req.job_id, req.target_lang)
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
-    except Exception as exc:
-        logger.exception("LaTeX ham üretimi sırasında beklenmeyen hata")
-        raise HTTPException(
-            status_code=500,
-            detail="Sunucu hatası, lütfen daha sonra tekrar deneyin."
-        )
+    except dbUnavailableError:
+        # db_unavailable_handler 503 + Retry-After döner
+        raise
+    except Exception:
+        logger.exception("LaTeX akışı başlatılırken beklenmeyen hata")
+        raise HTTPException(status_code=500, detail="Sunucu hatası, lütfen daha sonra tekrar deneyin.")
+
+    if "text/event-stream" not in request.headers.get("accept", ""):
+        return StreamingResponse(chunks, media_type="text/plain")
+
+    async def events():
+        try:
+            async for chunk in chunks:
+                yield SseEvent(chunk)
+            yield SseEvent("", event="done")
+        except Exception:
+            logger.exception("LaTeX akışı sırasında beklenmeyen hata")
+            yield SseEvent("Sunucu hatası", event="error")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/cv-jobs", status_code=202)
+async def submit_cv_job(req: GenerateCvRequest, request: Request):
+    try:
+        cv_job_id = await request.app.state.cv_jobs.Submit(req.raw_cv, req.job_id, req.target_lang)
+    except cvJobQueueFull:
+        raise HTTPException(status_code=503, detail="Kuyruk dolu, lütfen daha sonra tekrar deneyin.")
+    return {"id": cv_job_id, "status": "queued"}
+
+@app.get("/cv-jobs/{cv_job_id}")
+async def get_cv_job(cv_job_id: str, request: Request):
+    doc = await request.app.state.cv_jobs.Get(cv_job_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="CV işi bulunamadı")
+    return {
+        "id": doc["_id"],
+        "status": doc.get("status"),
+        "job_id": doc.get("job_id"),
+        "target_lang": doc.get("target_lang"),
+        "latex_cv": doc.get("latex_cv"),
+        "error": doc.get("error"),
+        "created_at": doc["created_at"].isoformat() if doc.get("created_at") else None,
+        "finished_at": doc["finished_at"].isoformat() if doc.get("finished_at") else None
+    }
 
 async def trigger_all_jobs():
-    jobs = scheduler.get_jobs()
-    for job in jobs:
-        func_ref = getattr(job, 'func_ref', None)
-        if func_ref:
-            if ':' in func_ref:
-                mod_name, func_name = func_ref.split(':')
-            else:
-                mod_name, func_name = func_ref.rsplit('.', 1)
-            mod = importlib.import_module(mod_name)
-            func = getattr(mod, func_name)
-            if asyncio.iscoroutinefunction(func):
-                asyncio.create_task(func())
-            else:
-                func()
+    # Fonksiyonları doğrudan çağırmak yerine scheduler üzerinden öne çekilir;
+    # böylece max_instances ve görev kilitleri elle tetiklemelerde de geçerli olur
+    now = datetime.now(timezone.utc)
+    for job in scheduler.get_jobs():
+        job.modify(next_run_time=now)
 
 @app.post("/start")
 async def start_system(cmd: StartCommand):
@@ -135,6 +216,15 @@ async def get_scheduler_status():
         ]
     }
 
+@app.on_event("startup")
+async def on_startup():
+    # Uygulama ömrü boyunca tek Mongo bağlantı havuzu (MONGODB_MAX_POOL_SIZE)
+    app.state.db = db
+    await db.EnsureIndexes()
+    app.state.cv_service = cvGenerationService(db)
+    app.state.cv_jobs = BuildCvJobQueue(db, app.state.cv_service.Generate)
+    await app.state.cv_jobs.Start()
+
 @app.on_event("shutdown")
 async def on_shutdown():
     try:
@@ -142,6 +232,9 @@ async def on_shutdown():
         logger.info("Scheduler düzgün şekilde kapatıldı (shutdown event içinde).")
     except Exception as e:
         logger.error(f"Scheduler kapatma hatası: {e}")
+    await app.state.cv_jobs.Stop()
+    await CloseMistralClient()
+    app.state.db.Close()
 
 if __name__ == "__main__":
     uvicorn.run(
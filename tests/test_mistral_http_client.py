@@ -0,0 +1,67 @@
+import asyncio
+
+from aiohttp import web
+
+from nlp.nlpApi import mistralHttpClient
+
+FAKE_COMPLETION = {"choices": [{"message": {"role": "assistant", "content": "{}"}}]}
+
+async def _StubLlm():
+  # Her bağlantının istemci tarafı (ip, port) çifti benzersizdir; küme kabul edilen bağlantıları sayar
+  peers = set()
+
+  async def completions(request: web.Request) -> web.Response:
+    peers.add(request.transport.get_extra_info("peername"))
+    await request.read()
+    await asyncio.sleep(0.02)
+    return web.json_response(FAKE_COMPLETION)
+
+  app = web.Application()
+  app.router.add_post("/v1/chat/completions", completions)
+  runner = web.AppRunner(app, access_log = None)
+  await runner.setup()
+  await web.TCPSite(runner, "127.0.0.1", 0).start()
+  host, port = runner.addresses[0][:2]
+  return runner, f"http://{host}:{port}/v1/chat/completions", peers
+
+async def _Post(client: mistralHttpClient, url: str) -> int:
+  session = await client.GetSession()
+  async with session.post(url, json = {"messages": []}) as resp:
+    await resp.json()
+    return resp.status
+
+def test_shared_session_keeps_connection_count_bounded():
+  async def run():
+    runner, url, peers = await _StubLlm()
+    client = mistralHttpClient(limit_per_host = 4)
+    try:
+      statuses = []
+      for _ in range(3):
+        statuses += await asyncio.gather(*[_Post(client, url) for _ in range(40)])
+    finally:
+      await client.Close()
+      await runner.cleanup()
+    return statuses, peers
+
+  statuses, peers = asyncio.run(run())
+  assert statuses == [200] * 120
+  # 120 istek 3 dalgada gitse de bağlantı sayısı host başına sınırı aşmaz ve dalgalar arasında yeniden kullanılır
+  assert 1 <= len(peers) <= 4
+
+def test_session_recreated_and_old_one_closed_on_new_loop():
+  client = mistralHttpClient()
+
+  async def first():
+    return await client.GetSession()
+
+  old = asyncio.run(first())
+
+  async def second():
+    session = await client.GetSession()
+    await client.Close()
+    return session
+
+  new = asyncio.run(second())
+  assert new is not old
+  assert old.closed
+  assert client.session is None
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from dbprocess.write_buffer import writeBehindBuffer
+
+class fakeDb:
+  """BulkWrite'ı taklit eder: yazılan operasyonları toplar, gecikme ve hata enjekte edilebilir."""
+  def __init__( self, delay : float = 0.0, fail_calls = () ):
+    self.delay = delay
+    self.fail_calls = set( fail_calls )
+    self.written = []
+    self.calls = 0
+
+  async def BulkWrite( self, c, reqs, chunk ):
+    self.calls += 1
+    await asyncio.sleep( self.delay )
+    if self.calls in self.fail_calls:
+      raise RuntimeError( "transient" )
+    self.written.extend( reqs )
+    return [ { "inserted": len( reqs ), "upserted": 0, "matched": 0, "modified": 0, "deleted": 0, "errors": 0 } ]
+
+def test_close_during_inflight_flush_writes_every_op():
+  async def run():
+    db = fakeDb( delay = 0.2 )
+    buf = writeBehindBuffer( db, "col", max_ops = 100, max_delay = 0.01 )
+    buf.Start()
+    for i in range( 10 ):
+      await buf.Add( i )
+    # Zamanlayıcının flush'ı başlatıp BulkWrite içinde beklemesi için
+    await asyncio.sleep( 0.05 )
+    assert db.calls == 1 and not buf.ops
+    await buf.Close()
+    return db
+
+  db = asyncio.run( run() )
+  assert sorted( db.written ) == list( range( 10 ) )
+
+def test_failed_timer_flush_keeps_ops_for_next_flush():
+  async def run():
+    db = fakeDb( fail_calls = { 1 } )
+    async with writeBehindBuffer( db, "col", max_ops = 4, max_delay = 0.01 ) as buf:
+      for i in range( 10 ):
+        buf.ops.append( i )
+        await buf.slots.acquire()
+      await asyncio.sleep( 0.05 )
+    return db, buf
+
+  db, buf = asyncio.run( run() )
+  assert sorted( db.written ) == list( range( 10 ) )
+  assert buf.stats[ "inserted" ] == 10
+  assert not buf.ops
+
+def test_close_raises_and_requeues_only_unwritten_chunks():
+  async def run():
+    # İlk parça yazılır, ikinci parça ve sonrası kalıcı olarak düşer
+    db = fakeDb( fail_calls = range( 2, 100 ) )
+    buf = writeBehindBuffer( db, "col", max_ops = 4, max_delay = 60 )
+    buf.Start()
+    buf.ops.extend( range( 10 ) )
+    with pytest.raises( RuntimeError ):
+      await buf.Close()
+    return db, buf
+
+  db, buf = asyncio.run( run() )
+  assert db.written == [ 0, 1, 2, 3 ]
+  assert buf.ops == list( range( 4, 10 ) )